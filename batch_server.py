@@ -0,0 +1,252 @@
+import argparse
+import asyncio
+import collections
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import retrieve
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+MAX_BATCH = 32          # flush once this many queries are waiting
+WINDOW_MS = 5.0         # ...or this long after the first query arrived
+LATENCY_WINDOW = 10000  # number of recent latencies kept for percentiles
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+# ---------------------------------------------------------
+#  Micro-batcher
+# ---------------------------------------------------------
+
+class MicroBatcher:
+    """
+    Collects queries arriving within `window_ms` (or up to `max_batch`) and
+    answers them with one encode call and one index.search per language.
+
+    Encoding and search run in a single worker thread so the event loop
+    keeps accepting requests while a batch is being processed. Each query's
+    rerank budget (`budget_ms`, see rerank.QueryBudget) is counted from when
+    it was queued, so reranking one batch can't hold up the queries behind it
+    for longer than their own budget.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, window_ms=WINDOW_MS, reranker="none", budget_ms=None):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.reranker = reranker
+        self.budget_ms = budget_ms
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batcher")
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = collections.Counter()
+        self.served = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def search(self, query, lang="en", k=3):
+        """
+        Queue a query and wait for its own results.
+
+        Raises ValueError for a bad request before it is queued, so it can't
+        fail the batch it would have joined.
+        """
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("query must be a non-empty string")
+        if lang not in retrieve.INDEX_FILES:
+            raise ValueError(f"Invalid language: {lang!r} (expected one of {sorted(retrieve.INDEX_FILES)})")
+        if not isinstance(k, int) or k < 1:
+            raise ValueError(f"k must be a positive integer, got {k!r}")
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, lang, k, time.perf_counter(), future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batch_sizes[len(batch)] += 1
+            try:
+                results = await loop.run_in_executor(self.executor, self._process, batch)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            for (_, _, _, enqueued, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                    continue
+                self.latencies.append((now - enqueued) * 1000)
+                self.served += 1
+                future.set_result(result)
+
+    def _process(self, batch):
+        """
+        Encode every query once, then run one index.search per language.
+
+        A language group that fails gets the exception as each of its
+        results, leaving the other groups' callers unaffected.
+        """
+        import numpy as np
+        import hierarchy
+        import rerank
+
+        model = retrieve.get_model()
+        with metrics.timer("query.encode_batch"):
+            vectors = np.asarray(model.encode([q for q, *_ in batch]), dtype="float32")
+        metrics.inc("query.requests", len(batch))
+        results = [None] * len(batch)
+
+        by_lang = collections.defaultdict(list)
+        for i, (_, lang, _, _, _) in enumerate(batch):
+            by_lang[lang].append(i)
+
+        for lang, rows in by_lang.items():
+            try:
+                index, metadata_map = retrieve.load_database(lang)
+                budgets = {i: rerank.QueryBudget(self.reranker, self.budget_ms, start=batch[i][3])
+                           for i in rows}
+                max_k = max(budgets[i].n_candidates(batch[i][2]) for i in rows)
+                doc_hierarchy = retrieve.get_hierarchy(lang)
+                top_docs = retrieve.TOP_DOCS if retrieve.TOP_DOCS is not None else hierarchy.TOP_DOCS
+                with metrics.timer("query.search_batch"):
+                    if doc_hierarchy is not None and top_docs:
+                        D, I = doc_hierarchy.search(vectors[rows], max_k, top_docs)
+                    else:
+                        D, I = index.search(vectors[rows], max_k)
+                for row, ids in zip(rows, I):
+                    query, _, k, _, _ = batch[row]
+                    hits = [metadata_map[i] for i in ids.tolist() if i in metadata_map]
+                    results[row], _ = rerank.rerank(query, hits, k, scorer=budgets[row].scorer,
+                                                    deadline=budgets[row].deadline)
+            except Exception as e:
+                metrics.inc("query.batch_errors")
+                for row in rows:
+                    results[row] = e
+        return results
+
+    def stats(self):
+        """Queue depth, batch-size distribution and p50/p95/p99 latency (ms)."""
+        latencies = sorted(self.latencies)
+        batches = sum(self.batch_sizes.values())
+        return {
+            "queue_depth": self.queue.qsize(),
+            "served": self.served,
+            "batches": batches,
+            "mean_batch_size": (sum(s * n for s, n in self.batch_sizes.items()) / batches) if batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+        }
+
+
+# ---------------------------------------------------------
+#  JSON-lines TCP front end
+# ---------------------------------------------------------
+
+async def handle_client(batcher, reader, writer):
+    """
+    One JSON object per line:
+      {"query": "...", "lang": "en", "k": 3}  → {"results": [...]}
+      {"stats": true}                         → batcher.stats()
+      {"metrics": true}                       → {"prometheus": "<text format>"}
+    """
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        try:
+            request = json.loads(line)
+            if request.get("stats"):
+                response = batcher.stats()
+            elif request.get("metrics"):
+                response = {"prometheus": metrics.to_prometheus()}
+            else:
+                results = await batcher.search(request.get("query"),
+                                               request.get("lang", "en"),
+                                               int(request.get("k", 3)))
+                response = {"results": results}
+        except Exception as e:
+            response = {"error": str(e)}
+        writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+        await writer.drain()
+    writer.close()
+
+
+async def serve(host, port, langs, max_batch, window_ms, reranker, budget_ms=None):
+    batcher = MicroBatcher(max_batch, window_ms, reranker, budget_ms).start()
+
+    # Load everything before accepting connections
+    loop = asyncio.get_running_loop()
+    for lang in langs:
+        await loop.run_in_executor(batcher.executor, retrieve.warmup, lang)
+
+    server = await asyncio.start_server(
+        lambda r, w: handle_client(batcher, r, w), host, port)
+    print(f"🚀 Micro-batching search server on {host}:{port} "
+          f"(max batch {max_batch}, window {window_ms} ms)")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async micro-batching PQNK search server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--lang", nargs="+", default=["en", "ur"], choices=sorted(retrieve.INDEX_FILES),
+                        help="Languages to load up front")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--window-ms", type=float, default=WINDOW_MS)
+    parser.add_argument("--rerank", choices=["cross", "lexical", "none"], default="none",
+                        help="Per-query second stage (default: none, for throughput)")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Per-query latency budget from arrival, in milliseconds")
+    parser.add_argument("--backend", choices=["torch", "onnx", "onnx-int8"],
+                        help="Query encoder backend (default: EMBED_BACKEND or torch)")
+    args = parser.parse_args()
+
+    retrieve.BACKEND = args.backend
+    retrieve.RERANKER = args.rerank
+    retrieve.BUDGET_MS = args.budget_ms
+    try:
+        asyncio.run(serve(args.host, args.port, args.lang, args.max_batch,
+                          args.window_ms, args.rerank, args.budget_ms))
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped.")
@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+import retrieve
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+QUERY_LOG = "benchmark_queries.jsonl"   # requests.jsonl format + "lang"/"relevant"
+OUTPUT_FILE = "bench_output.json"
+
+SYNTHETIC_SIZES = [10_000, 100_000]
+TOP_DOCS = [3, 5, 10]
+QUERY_BATCH_SIZES = [1, 8, 32]
+EMBED_BATCH_SIZES = [1, 32]
+N_LATENCY_QUERIES = 200
+K = 3
+
+# A metric is reported as a regression when it gets this much worse
+REGRESSION_THRESHOLD = 0.10
+
+
+# ---------------------------------------------------------
+#  Helpers
+# ---------------------------------------------------------
+
+def _percentiles(samples_ms):
+    s = np.asarray(samples_ms)
+    return {
+        "p50_ms": float(np.percentile(s, 50)),
+        "p95_ms": float(np.percentile(s, 95)),
+        "p99_ms": float(np.percentile(s, 99)),
+        "mean_ms": float(s.mean()),
+    }
+
+
+def _rss_mb():
+    """
+    Current resident set size in MiB, or None where /proc isn't available.
+
+    faiss allocates outside the Python heap, so tracemalloc wouldn't see
+    the index; the RSS delta around a build does.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def load_query_log(path=QUERY_LOG):
+    """
+    Read a requests.jsonl-style query log.
+
+    Each line has request_id/title/body; the query text is `body` (or
+    `title`), `lang` picks the index and `relevant` lists filename
+    substrings that count as a hit.
+    """
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            queries.append({
+                "id": item.get("request_id"),
+                "text": item.get("body") or item.get("title", ""),
+                "lang": item.get("lang", "en"),
+                "relevant": item.get("relevant", []),
+            })
+    return queries
+
+
+def synthetic_corpus(n, dim, seed=0):
+    """Random unit vectors standing in for a larger chunk library."""
+    import faiss
+
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+# ---------------------------------------------------------
+#  Benchmarks
+# ---------------------------------------------------------
+
+def bench_embedding(model, texts, batch_sizes=EMBED_BATCH_SIZES):
+    """Chunks encoded per second at each batch size."""
+    results = {}
+    model.encode(texts[:1])  # exclude one-off warm-up from the timings
+    for bs in batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(texts), bs):
+            model.encode(texts[i:i + bs])
+        elapsed = time.perf_counter() - start
+        results[f"batch_{bs}"] = {"texts": len(texts), "seconds": elapsed,
+                                  "texts_per_s": len(texts) / elapsed}
+    return results
+
+
+def bench_index(vectors):
+    """Build time, serialized size and resident memory added by a flat inner-product index."""
+    import faiss
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    build_s = time.perf_counter() - start
+    rss_after = _rss_mb()
+    return index, {
+        "n": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]),
+        "build_s": build_s,
+        "index_mb": faiss.serialize_index(index).nbytes / (1024 * 1024),
+        "build_rss_mb": rss_after - rss_before if rss_before is not None else None,
+    }
+
+
+def bench_queries(index, query_vectors, k=K, batch_sizes=QUERY_BATCH_SIZES):
+    """Per-query search latency, single and batched."""
+    results = {}
+    for bs in batch_sizes:
+        samples = []
+        for i in range(0, len(query_vectors) - bs + 1, bs):
+            start = time.perf_counter()
+            index.search(query_vectors[i:i + bs], k)
+            samples.append((time.perf_counter() - start) * 1000 / bs)
+        results[f"batch_{bs}"] = _percentiles(samples)
+    return results
+
+
+def bench_hierarchy(lang, query_vectors, k=K, top_docs_list=TOP_DOCS):
+    """
+    Document-then-chunk search vs. flat search: recall of the flat top-k,
+    latency speedup and average chunks scored per query.
+    """
+    doc_hierarchy = retrieve.get_hierarchy(lang)
+    if doc_hierarchy is None:
+        return None
+    index, _ = retrieve.load_database(lang)
+
+    flat_ids, flat_ms = [], []
+    for q in query_vectors:
+        start = time.perf_counter()
+        _, I = index.search(q[None, :], k)
+        flat_ms.append((time.perf_counter() - start) * 1000)
+        flat_ids.append(set(I[0].tolist()) - {-1})
+
+    results = {"documents": doc_hierarchy.n_documents, "chunks": int(index.ntotal),
+               "flat": _percentiles(flat_ms)}
+    for top_docs in top_docs_list:
+        hier_ms, recalls = [], []
+        for q, truth in zip(query_vectors, flat_ids):
+            start = time.perf_counter()
+            _, I = doc_hierarchy.search(q[None, :], k, top_docs)
+            hier_ms.append((time.perf_counter() - start) * 1000)
+            found = set(I[0].tolist()) - {-1}
+            recalls.append(len(found & truth) / len(truth) if truth else 1.0)
+        _, doc_ids = doc_hierarchy.doc_index.search(query_vectors, min(top_docs, doc_hierarchy.n_documents))
+        scored = [sum(len(doc_hierarchy.doc_chunks[d]) for d in row if d != -1) for row in doc_ids]
+
+        stats = _percentiles(hier_ms)
+        stats[f"recall@{k}_vs_flat"] = float(np.mean(recalls))
+        stats["speedup_p50"] = results["flat"]["p50_ms"] / stats["p50_ms"] if stats["p50_ms"] else None
+        stats["mean_chunks_scored"] = float(np.mean(scored))
+        results[f"top_docs_{top_docs}"] = stats
+        print(f"   top_docs={top_docs}: recall@{k} vs flat {stats[f'recall@{k}_vs_flat']:.3f}, "
+              f"{stats['mean_chunks_scored']:.0f} chunks scored, "
+              f"p50 speedup {stats['speedup_p50'] or 0:.2f}x")
+    return results
+
+
+def bench_quality(lang, queries, k=K, reranker="none"):
+    """
+    recall@k and MRR (filename-level), end-to-end latency and the share of
+    queries whose rerank ran out of budget, for labelled queries.
+
+    Queries go through retrieve.run_search, so hierarchical search and the
+    rerank budget apply exactly as configured for the entry points.
+    """
+    import rerank
+
+    if reranker == "cross":
+        rerank.warmup()  # otherwise early queries degrade while the model loads
+
+    recalls, reciprocal_ranks, latencies, degraded = [], [], [], []
+    for q in queries:
+        start = time.perf_counter()
+        hits, info = retrieve.run_search(q["text"], k, lang, reranker=reranker)
+        latencies.append((time.perf_counter() - start) * 1000)
+        degraded.append(info["degraded"])
+
+        if not q["relevant"]:
+            continue
+        labels = [r.lower() for r in q["relevant"]]
+        matched = [any(l in h["filename"].lower() for l in labels) for h in hits]
+        found = {l for l in labels for h in hits if l in h["filename"].lower()}
+        recalls.append(len(found) / len(labels))
+        reciprocal_ranks.append(next((1 / (r + 1) for r, m in enumerate(matched) if m), 0.0))
+
+    result = {"queries": len(queries), "reranker": reranker,
+              "degraded_rate": float(np.mean(degraded)) if degraded else 0.0,
+              **_percentiles(latencies)}
+    if recalls:
+        result[f"recall@{k}"] = float(np.mean(recalls))
+        result["mrr"] = float(np.mean(reciprocal_ranks))
+    return result
+
+
+# ---------------------------------------------------------
+#  Suite
+# ---------------------------------------------------------
+
+def run_suite(query_log=QUERY_LOG, sizes=SYNTHETIC_SIZES, k=K, rerankers=("none",),
+              top_docs_list=TOP_DOCS):
+    model = retrieve.get_model()
+    queries = load_query_log(query_log) if os.path.exists(query_log) else []
+    results = {"shipped": {}, "synthetic": {}}
+
+    for lang in retrieve.INDEX_FILES:
+        print(f"\n📊 Shipped {retrieve.LANGUAGE_NAMES[lang]} index")
+        shipped, metadata_map = retrieve.load_database(lang)
+        vectors = shipped.reconstruct_n(0, shipped.ntotal)
+        texts = [metadata_map[i]["text"] for i in sorted(metadata_map)][:256]
+
+        _, index_stats = bench_index(vectors)
+        lang_queries = [q for q in queries if q["lang"] == lang]
+        query_vectors = np.asarray(
+            model.encode([q["text"] for q in lang_queries] or texts[:32]), dtype="float32")
+        reps = -(-N_LATENCY_QUERIES // len(query_vectors))
+        query_vectors = np.ascontiguousarray(np.tile(query_vectors, (reps, 1))[:N_LATENCY_QUERIES])
+
+        results["shipped"][lang] = {
+            "embedding": bench_embedding(model, texts),
+            "index": index_stats,
+            "search": bench_queries(shipped, query_vectors, k),
+            "quality": {r: bench_quality(lang, lang_queries, k, r) for r in rerankers},
+        }
+        hierarchical = bench_hierarchy(lang, query_vectors, k, top_docs_list)
+        if hierarchical:
+            results["shipped"][lang]["hierarchical"] = hierarchical
+
+    dim = shipped.d
+    query_vectors = synthetic_corpus(N_LATENCY_QUERIES, dim, seed=1)
+    for n in sizes:
+        print(f"\n📊 Synthetic corpus: {n} vectors")
+        index, index_stats = bench_index(synthetic_corpus(n, dim))
+        results["synthetic"][str(n)] = {
+            "index": index_stats,
+            "search": bench_queries(index, query_vectors, k),
+        }
+        del index
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "model": retrieve.MODEL_NAME,
+            "backend": retrieve.BACKEND or os.environ.get("EMBED_BACKEND", "torch"),
+            "k": k,
+            "top_docs": retrieve.TOP_DOCS,
+            "budget_ms": retrieve.BUDGET_MS,
+        },
+        "results": results,
+    }
+
+
+def _flatten(d, prefix=""):
+    for key, value in d.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(current, previous, threshold=REGRESSION_THRESHOLD):
+    """Print metrics that got worse than `threshold` versus a previous run."""
+    before = dict(_flatten(previous["results"]))
+    regressions = []
+    for name, value in _flatten(current["results"]):
+        old = before.get(name)
+        if not old:
+            continue
+        # Lower is better for timings/sizes, higher for throughput/quality
+        higher_is_better = name.endswith(("texts_per_s", "mrr", "speedup_p50")) or "recall@" in name
+        change = (value - old) / old
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            regressions.append((name, old, value, change))
+
+    for name, old, value, change in regressions:
+        print(f"❌ {name}: {old:.4g} → {value:.4g} ({change:+.1%})")
+    if not regressions:
+        print(f"✅ No regressions beyond {threshold:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding / index / query benchmark suite")
+    parser.add_argument("--queries", default=QUERY_LOG, help="Query log (requests.jsonl format)")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SYNTHETIC_SIZES,
+                        help="Synthetic corpus sizes")
+    parser.add_argument("-k", type=int, default=K)
+    parser.add_argument("--rerank", nargs="+", default=["none"], choices=["none", "lexical", "cross"],
+                        help="Rerankers to evaluate for quality")
+    parser.add_argument("--top-docs", type=int, nargs="*", default=TOP_DOCS,
+                        help="Document counts to evaluate for hierarchical search")
+    parser.add_argument("--backend", choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Per-query latency budget for the quality run (default: rerank.BUDGET_MS)")
+    parser.add_argument("--search-top-docs", type=int, default=None,
+                        help="Documents searched per quality query (default: hierarchy.TOP_DOCS, 0 = flat)")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--compare", help="Previous results file to check for regressions")
+    args = parser.parse_args()
+
+    retrieve.BACKEND = args.backend
+    retrieve.BUDGET_MS = args.budget_ms
+    retrieve.TOP_DOCS = args.search_top_docs
+    report = run_suite(args.queries, args.sizes, args.k, args.rerank, args.top_docs)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written → {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            raise SystemExit(1)
@@ -0,0 +1,331 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import metrics
+import pipeline_config
+from encoder import DEFAULT_BACKEND
+
+# Only pipeline_config and encoder (both dependency-free at import) are
+# loaded up front. The scripts that do the work (database.py, make_embeddings.py,
+# the converters) import pandas, faiss, fitz and the translators at module
+# level, so they are imported inside the step runners: --dry-run needs none
+# of them installed.
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+DOCUMENTS_DIR = pipeline_config.DOCUMENTS_DIR
+MERGED_DIR = pipeline_config.MERGED_DIR
+FAISS_DIR = pipeline_config.FAISS_DIR
+MANIFEST_FILE = "build_manifest.json"
+
+# Per-document chunk embeddings (one .npz per .txt file)
+CACHE_DIR = "embeddings_output/cache"
+
+LANG_CODES = {"english": "en", "urdu": "ur"}
+
+
+# ---------------------------------------------------------
+#  Manifest + hashing
+# ---------------------------------------------------------
+
+def load_manifest(path=MANIFEST_FILE):
+    if not os.path.exists(path):
+        return {"version": 1, "steps": {}, "hashes": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def file_hash(path, manifest):
+    """
+    SHA-256 of a file's content.
+
+    Hashes are cached in the manifest by (size, mtime) so unchanged files
+    are not re-read on every build.
+    """
+    st = os.stat(path)
+    cached = manifest["hashes"].get(path)
+    if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+        metrics.inc("build.hash_cache_hits")
+        return cached["sha256"]
+
+    metrics.inc("build.hashed_bytes", st.st_size)
+
+    h = hashlib.sha256()
+    with metrics.timer("build.hash"), open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    manifest["hashes"][path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+    return digest
+
+
+# ---------------------------------------------------------
+#  Build steps
+# ---------------------------------------------------------
+
+class Step:
+    """One artifact-producing unit of work in the build graph."""
+
+    def __init__(self, stage, target, inputs, outputs, params, run, optional=False):
+        self.stage = stage
+        self.key = f"{stage}:{target}"
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params
+        self.run = run
+        self.optional = optional  # network stages; only run with --translate
+
+
+def _write_text(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _extract(pdf, txt):
+    from convert_pdf_to_text import extract_pdf_text
+
+    _write_text(txt, extract_pdf_text(pdf))
+
+
+def _translate_to_urdu(pdf, txt):
+    from convert_to_urdu import extract_text_from_pdf, translate_large_text
+
+    _write_text(txt, translate_large_text(extract_text_from_pdf(pdf)))
+
+
+def _translate_to_english(pdf, txt):
+    from convert_urdu_to_eng import extract_text_from_pdf, translate_large_text
+
+    _write_text(txt, translate_large_text(extract_text_from_pdf(pdf)))
+
+
+def _embed(txt, cache):
+    """Chunk + embed one text file into a per-document .npz."""
+    import numpy as np
+    from make_embeddings import clean_text, detect_encoding, get_model, prepare_chunks
+
+    with open(txt, "r", encoding=detect_encoding(txt), errors="ignore") as f:
+        text = clean_text(f.read().strip())
+    kept = prepare_chunks(text) if len(text) >= 50 else []
+    with metrics.timer("embed.encode"):
+        vectors = (np.asarray(get_model().encode([c for _, c, _ in kept]), dtype="float32")
+                   if kept else np.zeros((0, 0), dtype="float32"))
+    metrics.inc("embed.chunks", len(kept))
+
+    os.makedirs(os.path.dirname(cache), exist_ok=True)
+    with open(cache, "wb") as f:
+        np.savez(f,
+                 vectors=vectors,
+                 chunk_ids=np.array([i for i, _, _ in kept], dtype="int64"),
+                 texts=np.array([c for _, c, _ in kept], dtype=str),
+                 langs=np.array([l for _, _, l in kept], dtype=str))
+
+
+def _merge(lang, caches):
+    """Concatenate per-document caches into merged CSV/NPY for one language."""
+    import numpy as np
+    from ingest import save_merged
+    from merge_embeddings import clean_bidi_chars
+
+    rows, vectors = [], []
+    for cache in caches:
+        data = np.load(cache)
+        category = os.path.basename(os.path.dirname(cache))
+        filename = os.path.basename(cache)[:-len(".npz")]
+        for j, lang_code in enumerate(data["langs"]):
+            if lang_code != LANG_CODES[lang]:
+                continue
+            text = str(data["texts"][j])
+            rows.append({
+                "category": category,
+                "filename": filename,
+                "chunk_id": int(data["chunk_ids"][j]),
+                "language": lang_code,
+                "text": clean_bidi_chars(text) if lang == "urdu" else text,
+            })
+            vectors.append(data["vectors"][j])
+
+    if not rows:
+        raise RuntimeError(f"No {lang} chunks to merge")
+    save_merged(lang, rows, np.vstack(vectors))
+
+
+def _index(lang):
+    import database
+
+    database.build_faiss_for_language(lang)
+
+
+def plan(docs_dir=DOCUMENTS_DIR, translate=False):
+    """Build the ordered list of steps PDF → txt → _urdu.txt → chunks → merged → index."""
+
+    steps = []
+    txts = {}  # txt path → category
+
+    for category in sorted(os.listdir(docs_dir)):
+        category_path = os.path.join(docs_dir, category)
+        if not os.path.isdir(category_path):
+            continue
+        for file in sorted(os.listdir(category_path)):
+            path = os.path.join(category_path, file)
+            if file.endswith(".txt"):
+                txts[path] = category
+            if not file.lower().endswith(".pdf"):
+                continue
+
+            base = os.path.splitext(path)[0]
+            if file in pipeline_config.TARGET_PDFS:
+                # Urdu source PDF: the .txt is an English translation
+                steps.append(Step("translate-en", path, [path], [base + ".txt"],
+                                  {"source": "ur", "target": "en", "chunk_size": 3000},
+                                  lambda p=path, t=base + ".txt": _translate_to_english(p, t),
+                                  optional=True))
+            else:
+                steps.append(Step("extract", path, [path], [base + ".txt"],
+                                  {"extractor": "pymupdf"},
+                                  lambda p=path, t=base + ".txt": _extract(p, t)))
+            steps.append(Step("translate-ur", path, [path], [base + "_urdu.txt"],
+                              {"source": "en", "target": "ur", "chunk_size": 4000},
+                              lambda p=path, t=base + "_urdu.txt": _translate_to_urdu(p, t),
+                              optional=True))
+
+    for step in steps:
+        if not step.optional or translate:
+            for out in step.outputs:
+                txts.setdefault(out, os.path.basename(os.path.dirname(out)))
+
+    embed_params = {"model": pipeline_config.MODEL_NAME, "backend": DEFAULT_BACKEND,
+                    "chunk_size": pipeline_config.CHUNK_SIZE, "overlap": pipeline_config.OVERLAP}
+    caches = []
+    for txt in sorted(txts):
+        cache = os.path.join(CACHE_DIR, txts[txt], os.path.basename(txt) + ".npz")
+        caches.append(cache)
+        steps.append(Step("embed", txt, [txt], [cache], embed_params,
+                          lambda t=txt, c=cache: _embed(t, c)))
+
+    for lang in LANG_CODES:
+        csv = os.path.join(MERGED_DIR, f"{lang}_embeddings_merged.csv")
+        npy = os.path.join(MERGED_DIR, f"{lang}_vectors_merged.npy")
+        steps.append(Step("merge", lang, list(caches), [csv, npy], {},
+                          lambda l=lang: _merge(l, caches)))
+        steps.append(Step("index", lang, [csv, npy],
+                          [os.path.join(FAISS_DIR, f"{lang}_faiss.index"),
+                           os.path.join(FAISS_DIR, f"{lang}_metadata.json"),
+                           os.path.join(FAISS_DIR, f"{lang}_doc_faiss.index"),
+                           os.path.join(FAISS_DIR, f"{lang}_doc_chunks.json")],
+                          {"metric": "cosine", "base_url": pipeline_config.BASE_URL},
+                          lambda l=lang: _index(l)))
+    return steps
+
+
+# ---------------------------------------------------------
+#  Staleness + execution
+# ---------------------------------------------------------
+
+def stale_reason(step, manifest, dirty):
+    """Why `step` must run, or None if its outputs are up to date."""
+    if any(i in dirty for i in step.inputs):
+        return "input rebuilt"
+    record = manifest["steps"].get(step.key)
+    if record is None:
+        return "untracked"
+    if record["params"] != step.params:
+        return "parameters changed"
+    if sorted(record["inputs"]) != sorted(step.inputs):
+        return "input set changed"
+    for out in step.outputs:
+        if not os.path.exists(out):
+            return f"missing {os.path.basename(out)}"
+        if file_hash(out, manifest) != record["outputs"].get(out):
+            return f"{os.path.basename(out)} modified"
+    for inp in step.inputs:
+        if not os.path.exists(inp) or file_hash(inp, manifest) != record["inputs"][inp]:
+            return f"{os.path.basename(inp)} changed"
+    return None
+
+
+def record_step(step, manifest):
+    manifest["steps"][step.key] = {
+        "params": step.params,
+        "inputs": {i: file_hash(i, manifest) for i in step.inputs},
+        "outputs": {o: file_hash(o, manifest) for o in step.outputs},
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def rebuild(docs_dir=DOCUMENTS_DIR, dry_run=False, translate=False, adopt=False):
+    """Run only the steps whose inputs, parameters or outputs changed."""
+    manifest = load_manifest()
+    dirty = set()
+    ran = skipped = 0
+
+    for step in plan(docs_dir, translate):
+        reason = stale_reason(step, manifest, dirty)
+        if reason is None:
+            continue
+
+        if reason == "untracked" and adopt and all(os.path.exists(o) for o in step.outputs) \
+                and all(os.path.exists(i) for i in step.inputs):
+            # Existing artifacts from the old scripts: trust them as-is
+            record_step(step, manifest)
+            continue
+
+        if step.optional and not translate:
+            if not all(os.path.exists(o) for o in step.outputs):
+                continue  # never produced; only --translate creates it
+            print(f"⏭️ {step.key} is stale ({reason}) — rerun with --translate")
+            skipped += 1
+            continue
+
+        if dry_run:
+            print(f"🔸 would run {step.key} ({reason})")
+            dirty.update(step.outputs)
+            ran += 1
+            continue
+
+        print(f"⚙️ {step.key} ({reason})")
+        try:
+            with metrics.timer(f"build.{step.stage}"):
+                step.run()
+        except Exception as e:
+            print(f"❌ {step.key} failed: {e}")
+            save_manifest(manifest)
+            raise
+        record_step(step, manifest)
+        dirty.update(step.outputs)
+        save_manifest(manifest)
+        ran += 1
+        metrics.inc(f"build.{step.stage}_runs")
+
+    if not dry_run:
+        save_manifest(manifest)
+    verb = "would run" if dry_run else "ran"
+    print(f"\n🎉 Build {'plan' if dry_run else 'complete'}: {verb} {ran} step(s), "
+          f"{skipped} stale optional step(s) skipped.")
+    return ran
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental PDF → FAISS build")
+    parser.add_argument("--docs-dir", default=DOCUMENTS_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would run")
+    parser.add_argument("--translate", action="store_true",
+                        help="Also (re)run translation steps (network)")
+    parser.add_argument("--adopt", action="store_true",
+                        help="Record existing untracked artifacts as up to date instead of rebuilding")
+    args = parser.parse_args()
+
+    with metrics.profiled("build"):
+        rebuild(args.docs_dir, args.dry_run, args.translate, args.adopt)
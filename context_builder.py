@@ -0,0 +1,180 @@
+import re
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+# Consecutive chunks share OVERLAP words (see make_embeddings.py)
+from pipeline_config import OVERLAP
+
+TOKEN_BUDGET = 1500
+MMR_LAMBDA = 0.7        # 1.0 = pure relevance, 0.0 = pure diversity
+MIN_SPAN_TOKENS = 32    # don't bother packing a truncated span smaller than this
+MAX_GAP = 1             # missing chunks pulled in to join two hits of one document
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def count_tokens(text):
+    """Cheap, model-independent token estimate (words + punctuation marks)."""
+    return len(_TOKEN_RE.findall(text))
+
+
+# ---------------------------------------------------------
+#  Adjacency index + overlap merging
+# ---------------------------------------------------------
+
+def build_adjacency(metadata):
+    """Map (category, filename, chunk_id) → metadata record, computed once per store."""
+    adjacency = {}
+    for record in metadata:
+        # Filenames are only unique within a category
+        adjacency.setdefault((record.get("category"), record.get("filename"), record.get("chunk_id")), record)
+    return adjacency
+
+
+def merge_overlap(left, right, max_overlap=2 * OVERLAP):
+    """
+    Join two consecutive chunks, dropping the words `right` repeats from
+    the end of `left`.
+    """
+    a, b = left.split(), right.split()
+    for k in range(min(max_overlap, len(a), len(b)), 0, -1):
+        if a[-k:] == b[:k]:
+            return " ".join(a + b[k:])
+    return " ".join(a + b)
+
+
+def _group_runs(passages, adjacency):
+    """
+    Group ranked passages into runs of adjacent chunks of the same document.
+
+    Two hits separated by at most MAX_GAP chunks that weren't retrieved are
+    joined into one run, with the missing chunks taken from `adjacency`, so
+    the context reads continuously instead of as two fragments.
+
+    Returns a list of runs (each a list of records in chunk order) ordered by
+    the rank of their best passage.
+    """
+    hits = {}
+    for rank, p in enumerate(passages):
+        hits.setdefault((p.get("category"), p.get("filename"), p.get("chunk_id")), (rank, p))
+
+    seen = set()
+    runs = []
+    for key in sorted(hits, key=lambda k: hits[k][0]):
+        if key in seen:
+            continue
+        category, filename, chunk_id = key
+
+        def next_hit(c, step):
+            """Chunk id of the next hit within MAX_GAP chunks of c, or None."""
+            for distance in range(1, MAX_GAP + 2):
+                target = c + step * distance
+                if (category, filename, target) in hits:
+                    return target
+                if (category, filename, target) not in adjacency:
+                    return None
+            return None
+
+        # Walk outwards through neighbouring hits, bridging short gaps
+        lo = hi = chunk_id
+        while (c := next_hit(lo, -1)) is not None:
+            lo = c
+        while (c := next_hit(hi, +1)) is not None:
+            hi = c
+        run_keys = [(category, filename, c) for c in range(lo, hi + 1)]
+        seen.update(run_keys)
+        runs.append((min(hits[k][0] for k in run_keys if k in hits),
+                     [hits[k][1] if k in hits else adjacency[k] for k in run_keys]))
+    runs.sort(key=lambda r: r[0])
+    return runs
+
+
+# ---------------------------------------------------------
+#  MMR selection + token-budget packing
+# ---------------------------------------------------------
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def assemble_context(passages, adjacency=None, token_budget=TOKEN_BUDGET,
+                     mmr_lambda=MMR_LAMBDA, tokenizer=count_tokens):
+    """
+    Turn ranked passages into de-duplicated context spans.
+
+    1. Adjacent chunks of the same file are merged and their overlap removed.
+    2. Spans are ordered by MMR (rank-based relevance vs. word-set similarity
+       to the spans already chosen).
+    3. Spans are packed until `token_budget` is reached; the last span is
+       truncated if at least MIN_SPAN_TOKENS still fit.
+
+    Returns a list of dicts: filename, category, chunk_ids, text, tokens.
+    """
+    if adjacency is None:
+        adjacency = build_adjacency(passages)
+
+    spans = []
+    for rank, (_, run) in enumerate(_group_runs(passages, adjacency)):
+        text = run[0]["text"]
+        for record in run[1:]:
+            text = merge_overlap(text, record["text"])
+        spans.append({
+            "filename": run[0].get("filename", ""),
+            "category": run[0].get("category", ""),
+            "chunk_ids": [r.get("chunk_id") for r in run],
+            "text": text,
+            "relevance": 1.0 / (1 + rank),
+            "words": set(_WORD_RE.findall(text.lower())),
+        })
+
+    selected, used = [], 0
+    remaining = spans
+    while remaining and used < token_budget:
+        def mmr(span):
+            redundancy = max((_jaccard(span["words"], s["words"]) for s in selected), default=0.0)
+            return mmr_lambda * span["relevance"] - (1 - mmr_lambda) * redundancy
+
+        best = max(remaining, key=mmr)
+        remaining = [s for s in remaining if s is not best]
+
+        header = f"[Document {len(selected) + 1}] {best['filename']}"
+        available = token_budget - used - tokenizer(header)
+        tokens = tokenizer(best["text"])
+        if tokens > available:
+            if available < MIN_SPAN_TOKENS:
+                continue
+            best["text"] = _truncate(best["text"], available, tokenizer)
+            tokens = tokenizer(best["text"])
+
+        used += tokens + tokenizer(header)
+        selected.append(best)
+        best["tokens"] = tokens
+
+    for span in selected:
+        del span["relevance"], span["words"]
+    return selected
+
+
+def _truncate(text, max_tokens, tokenizer):
+    """Cut `text` at a word boundary so it fits in `max_tokens`."""
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if tokenizer(" ".join(words[:mid])) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+
+def format_context(spans):
+    """Render spans as the numbered [Document i] blocks used for prompting."""
+    return "".join(
+        f"[Document {i + 1}] {s['filename']}\n{s['text']}\n\n" for i, s in enumerate(spans)
+    )
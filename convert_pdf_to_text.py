@@ -1,30 +1,37 @@
 import os
 import fitz  # PyMuPDF
 
+import metrics
+
 # Path to your main folder
 
 BASE_DIR = r"C:\Users\Dell-5420\Downloads\fyp_github\fyp_text"
 
 
-for root, dirs, files in os.walk(BASE_DIR):
-    for file in files:
-        if file.lower().endswith(".pdf"):
-            pdf_path = os.path.join(root, file)
-            txt_path = os.path.splitext(pdf_path)[0] + ".txt"
+@metrics.timed("extract.pdf")
+def extract_pdf_text(pdf_path):
+    """Return the text of every page of a PDF, concatenated."""
+    with fitz.open(pdf_path) as doc:
+        return "".join(page.get_text("text") for page in doc)
+
+
+if __name__ == "__main__":
+    for root, dirs, files in os.walk(BASE_DIR):
+        for file in files:
+            if file.lower().endswith(".pdf"):
+                pdf_path = os.path.join(root, file)
+                txt_path = os.path.splitext(pdf_path)[0] + ".txt"
 
-            # Skip if txt already exists
-            if os.path.exists(txt_path):
-                print(f"⏭️ Skipping (already converted): {file}")
-                continue
+                # Skip if txt already exists
+                if os.path.exists(txt_path):
+                    print(f"⏭️ Skipping (already converted): {file}")
+                    continue
 
-            text = ""
-            with fitz.open(pdf_path) as doc:
-                for page in doc:
-                    text += page.get_text("text")
+                text = extract_pdf_text(pdf_path)
 
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(text)
+                with open(txt_path, "w", encoding="utf-8") as f:
+                    f.write(text)
 
-            print(f"✅ Converted: {file} → {os.path.basename(txt_path)}")
+                print(f"✅ Converted: {file} → {os.path.basename(txt_path)}")
 
-print("\n🎉 Conversion complete — only new PDFs processed!")
\ No newline at end of file
+    print("\n🎉 Conversion complete — only new PDFs processed!")
\ No newline at end of file
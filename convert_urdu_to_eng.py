@@ -3,6 +3,8 @@ import fitz  # PyMuPDF
 import time
 from deep_translator import GoogleTranslator
 
+import metrics
+
 # Optional OCR fallback
 try:
     from PIL import Image
@@ -18,12 +20,8 @@ BASE_DIR = r"C:\Users\Dell-5420\Downloads\fyp_github\fyp_text"
 # 🔸 Folders to skip
 SKIP_FOLDERS = {'.git', '__pycache__', 'venv'}
 
-# 📝 Specify exact PDF names you want to translate
-# (Use exact file names as they appear in your folder)
-TARGET_PDFS = {
-    "Advisory_Paper_Mango_Pruning_Urdu.pdf"
-    # Add more file names here...
-}
+# 📝 The exact PDF names to translate are listed in pipeline_config.py
+from pipeline_config import TARGET_PDFS
 
 
 def extract_text_from_pdf(pdf_path):
@@ -55,7 +53,8 @@ def translate_large_text(text, chunk_size=3000, max_retries=3):
         success = False
         for attempt in range(1, max_retries + 1):
             try:
-                eng_chunk = GoogleTranslator(source="ur", target="en").translate(chunk)
+                with metrics.timer("translate.request"):
+                    eng_chunk = GoogleTranslator(source="ur", target="en").translate(chunk)
                 translated_chunks.append(eng_chunk)
                 print(f"   🔹 Translated chunk {i}/{len(chunks)} (try {attempt})")
                 success = True
@@ -63,48 +62,51 @@ def translate_large_text(text, chunk_size=3000, max_retries=3):
                 break
             except Exception as e:
                 print(f"   ⚠️ Error on chunk {i} (attempt {attempt}/{max_retries}): {e}")
+                metrics.inc("translate.retries")
                 time.sleep(3)
         if not success:
             print(f"   ❌ Failed to translate chunk {i} after {max_retries} tries.")
             translated_chunks.append("[Translation failed for this section]")
+            metrics.inc("translate.failures")
     return "\n".join(translated_chunks)
 
 
-# 🔸 Walk through all subfolders recursively
-for root, dirs, files in os.walk(BASE_DIR):
-    if any(skip in root for skip in SKIP_FOLDERS):
-        continue
+if __name__ == "__main__":
+    # 🔸 Walk through all subfolders recursively
+    for root, dirs, files in os.walk(BASE_DIR):
+        if any(skip in root for skip in SKIP_FOLDERS):
+            continue
 
-    category = os.path.basename(root)
-    print(f"\n📂 Processing category: {category}")
+        category = os.path.basename(root)
+        print(f"\n📂 Processing category: {category}")
 
-    for file_name in files:
-        if file_name not in TARGET_PDFS:  # Only process selected PDFs
-            continue
+        for file_name in files:
+            if file_name not in TARGET_PDFS:  # Only process selected PDFs
+                continue
 
-        pdf_path = os.path.join(root, file_name)
-        eng_txt_path = os.path.splitext(pdf_path)[0] + ".txt"
+            pdf_path = os.path.join(root, file_name)
+            eng_txt_path = os.path.splitext(pdf_path)[0] + ".txt"
 
-        # Skip already translated
-        if os.path.exists(eng_txt_path):
-            print(f"⏭️ Already translated: {file_name}")
-            continue
+            # Skip already translated
+            if os.path.exists(eng_txt_path):
+                print(f"⏭️ Already translated: {file_name}")
+                continue
 
-        print(f"➡️ Extracting and translating: {file_name}")
+            print(f"➡️ Extracting and translating: {file_name}")
 
-        # Step 1: Extract Urdu text
-        urdu_text = extract_text_from_pdf(pdf_path)
-        if not urdu_text:
-            print(f"⚠️ No text found in {file_name}")
-            continue
+            # Step 1: Extract Urdu text
+            urdu_text = extract_text_from_pdf(pdf_path)
+            if not urdu_text:
+                print(f"⚠️ No text found in {file_name}")
+                continue
 
-        # Step 2: Translate to English
-        english_text = translate_large_text(urdu_text)
+            # Step 2: Translate to English
+            english_text = translate_large_text(urdu_text)
 
-        # Step 3: Save translation
-        try:
-            with open(eng_txt_path, "w", encoding="utf-8") as f:
-                f.write(english_text)
-            print(f"✅ English version saved: {eng_txt_path}")
-        except Exception as e:
-            print(f"❌ Error saving English file for {file_name}: {e}")
+            # Step 3: Save translation
+            try:
+                with open(eng_txt_path, "w", encoding="utf-8") as f:
+                    f.write(english_text)
+                print(f"✅ English version saved: {eng_txt_path}")
+            except Exception as e:
+                print(f"❌ Error saving English file for {file_name}: {e}")
@@ -7,14 +7,11 @@ import glob
 from datetime import datetime
 from urllib.parse import quote  # safely encode URLs
 
-# --- Paths ---
-MERGED_DIR = "embeddings_output/merged"
-FAISS_DIR = "faiss_indexes"
-DOCUMENTS_DIR = "text_pdfs"  # where PDFs are stored
-os.makedirs(FAISS_DIR, exist_ok=True)
+import metrics
+# --- Paths + base URL where PDFs are hosted ---
+from pipeline_config import BASE_URL, DOCUMENTS_DIR, FAISS_DIR, MERGED_DIR
 
-# --- Base URL where PDFs are hosted ---
-BASE_URL = "https://yourdomain.com/pdfs"
+os.makedirs(FAISS_DIR, exist_ok=True)
 
 
 def build_faiss_for_language(lang):
@@ -32,28 +29,32 @@ def build_faiss_for_language(lang):
     npy_path = npy_files[0]
 
     # --- Load data ---
-    df = pd.read_csv(csv_path, encoding="utf-8-sig")
-    vectors = np.load(npy_path).astype('float32')
+    with metrics.timer("index.load_merged"):
+        df = pd.read_csv(csv_path, encoding="utf-8-sig")
+        vectors = np.load(npy_path).astype('float32')
     vectors = np.ascontiguousarray(vectors)
     faiss.normalize_L2(vectors)  # cosine similarity
 
-    # --- Create and save FAISS index ---
+    # --- Create FAISS index ---
     dim = vectors.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(vectors)
+    with metrics.timer("index.build"):
+        index = faiss.IndexFlatIP(dim)
+        index.add(vectors)
+
+    # --- Create metadata + save both ---
+    metadata = build_metadata(lang, (row for _, row in df.iterrows()))
+    save_index(lang, index, metadata)
 
-    index_path = os.path.join(FAISS_DIR, f"{lang}_faiss.index")
-    faiss.write_index(index, index_path)
-    print(f"✅ Saved FAISS index → {index_path}")
 
-    # --- Create metadata JSON ---
+def build_metadata(lang, rows):
+    """Build metadata records (id = row position) from rows with category/filename/chunk_id/text."""
     metadata = []
     current_time = datetime.utcnow().isoformat() + "Z"
 
     # Base PDF folder for each language
     pdf_base_url = BASE_URL if lang == "english" else f"{BASE_URL}/urdu_pdfs"
 
-    for i, row in df.iterrows():
+    for i, row in enumerate(rows):
         filename = row.get("filename", "")
 
         # --- Convert .txt → .pdf properly ---
@@ -79,18 +80,68 @@ def build_faiss_for_language(lang):
             }
         }
         metadata.append(record)
+    return metadata
+
+
+def save_index(lang, index, metadata):
+    """Write the FAISS index and its metadata JSON for a language."""
+    index_path = os.path.join(FAISS_DIR, f"{lang}_faiss.index")
+    with metrics.timer("index.write_index"):
+        faiss.write_index(index, index_path)
+    print(f"✅ Saved FAISS index → {index_path}")
 
     # --- Save metadata JSON ---
     json_path = os.path.join(FAISS_DIR, f"{lang}_metadata.json")
-    with open(json_path, "w", encoding="utf-8") as f:
+    with metrics.timer("index.write_metadata"), open(json_path, "w", encoding="utf-8") as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
+    metrics.inc("index.records", len(metadata))
 
     print(f"✅ Saved metadata JSON → {json_path}")
     print(f"📦 Total records: {len(metadata)}")
 
+    build_document_index(lang, index, metadata)
+
+
+def build_document_index(lang, index, metadata):
+    """
+    Build the document level of the two-level index.
+
+    One vector per document (the normalised centroid of its chunk vectors) goes
+    into {lang}_doc_faiss.index; {lang}_doc_chunks.json maps each document
+    id to its chunk ids so queries can search only the chunks of the top
+    documents (see hierarchy.py).
+    """
+    with metrics.timer("index.build_documents"):
+        vectors = index.reconstruct_n(0, index.ntotal)
+
+        docs = {}
+        for record in metadata:
+            # The same filename can appear in several categories with different text
+            key = (record["category"], record["filename"])
+            if key not in docs:
+                docs[key] = {"filename": record["filename"], "category": record["category"], "chunk_ids": []}
+            docs[key]["chunk_ids"].append(record["id"])
+        doc_list = list(docs.values())
+
+        centroids = np.stack([vectors[d["chunk_ids"]].mean(axis=0) for d in doc_list]).astype('float32')
+        centroids = np.ascontiguousarray(centroids)
+        faiss.normalize_L2(centroids)
+
+        doc_index = faiss.IndexFlatIP(centroids.shape[1])
+        doc_index.add(centroids)
+
+    doc_index_path = os.path.join(FAISS_DIR, f"{lang}_doc_faiss.index")
+    faiss.write_index(doc_index, doc_index_path)
+    doc_map_path = os.path.join(FAISS_DIR, f"{lang}_doc_chunks.json")
+    with open(doc_map_path, "w", encoding="utf-8") as f:
+        json.dump(doc_list, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Saved document index → {doc_index_path} ({len(doc_list)} documents)")
+
 
-# --- Run for both languages ---
-build_faiss_for_language("english")
-build_faiss_for_language("urdu")
+if __name__ == "__main__":
+    # --- Run for both languages ---
+    build_faiss_for_language("english")
+    build_faiss_for_language("urdu")
 
-print("\n🎉 FAISS indices + clean metadata JSON files with proper PDF URLs created successfully!")
+    print("\n🎉 FAISS indices + clean metadata JSON files with proper PDF URLs created successfully!")
@@ -0,0 +1,330 @@
+import argparse
+import json
+import math
+import os
+import time
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+DEFAULT_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+# Where exported ONNX models are written (one sub-folder per model)
+ONNX_DIR = "onnx_models"
+
+# "torch" (SentenceTransformer), "onnx" (fp32) or "onnx-int8" (dynamic int8)
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.environ.get("EMBED_BACKEND", "torch")
+
+# ONNX Runtime intra-op threads. EMBED_THREADS overrides the default, which
+# is the number of CPUs this process may actually use (affinity mask and
+# cgroup quota) rather than os.cpu_count(), which reports the host's cores
+# and oversubscribes inside containers. `python encoder.py --tune` measures
+# the best setting for this machine.
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", 0)) or None
+
+# Minimum cosine similarity between PyTorch and ONNX vectors
+PARITY_TOLERANCE = {"onnx": 0.999, "onnx-int8": 0.98}
+
+PARITY_SENTENCES = [
+    "How does PQNK farming improve soil moisture?",
+    "What is the best time to prune mango trees?",
+    "Microbial biodiversity unlocks nutrients for plants.",
+    "گندم کی کاشت کے لیے بہترین وقت کیا ہے؟",
+    "مٹی میں نمی کو کیسے برقرار رکھا جائے؟",
+]
+
+
+def available_cpus():
+    """CPUs usable by this process: affinity mask, capped by a cgroup v2 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def model_dir(model_name):
+    """Folder holding the exported ONNX files for `model_name`."""
+    return os.path.join(ONNX_DIR, model_name.replace("/", "__"))
+
+
+# ---------------------------------------------------------
+#  ONNX encoder
+# ---------------------------------------------------------
+
+class OnnxEncoder:
+    """
+    Drop-in replacement for SentenceTransformer.encode() backed by ONNX Runtime.
+
+    Runs the exported transformer and applies the same mean pooling (and
+    optional L2 normalisation) as the original SentenceTransformer pipeline.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, quantized=False, threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        folder = model_dir(model_name)
+        onnx_path = os.path.join(folder, "model-int8.onnx" if quantized else "model.onnx")
+        config_path = os.path.join(folder, "encoder_config.json")
+        if not os.path.exists(onnx_path) or not os.path.exists(config_path):
+            raise FileNotFoundError(
+                f"ONNX model not found: {onnx_path}. "
+                f"Run: python encoder.py --model {model_name} --export"
+                + (" --quantize" if quantized else "")
+            )
+
+        with open(config_path, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        threads = threads or EMBED_THREADS or available_cpus()
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(folder)
+        self.max_seq_length = self.config["max_seq_length"]
+        self.normalize = self.config["normalize"]
+        self.threads = threads
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimension"]
+
+    def _encode_batch(self, texts):
+        import numpy as np
+
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        feeds = {name: tokens[name].astype("int64") for name in self.input_names if name in tokens}
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over non-padding tokens
+        mask = tokens["attention_mask"][..., None].astype("float32")
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+
+        if self.normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings.astype("float32")
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        """Encode a string or list of strings (same shape rules as SentenceTransformer)."""
+        import numpy as np
+
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if len(sentences) == 0:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype="float32")
+
+        # Sort by length so each batch pads to a similar size, then restore order
+        order = sorted(range(len(sentences)), key=lambda i: -len(sentences[i]))
+        out = np.empty((len(sentences), self.get_sentence_embedding_dimension()), dtype="float32")
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            out[idx] = self._encode_batch([sentences[i] for i in idx])
+
+        return out[0] if single else out
+
+
+def load_encoder(model_name=DEFAULT_MODEL, backend=None, threads=None):
+    """
+    Return an object with an `encode()` method for the requested backend.
+
+    backend: "torch" (default, SentenceTransformer), "onnx" or "onnx-int8".
+    Defaults to the EMBED_BACKEND environment variable.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend: {backend!r} (expected one of {BACKENDS})")
+
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(model_name)
+    return OnnxEncoder(model_name, quantized=(backend == "onnx-int8"), threads=threads)
+
+
+# ---------------------------------------------------------
+#  Export / quantisation / parity check
+# ---------------------------------------------------------
+
+def export_onnx(model_name=DEFAULT_MODEL, opset=14):
+    """Export the transformer of a SentenceTransformer model to ONNX (fp32)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    folder = model_dir(model_name)
+    os.makedirs(folder, exist_ok=True)
+    onnx_path = os.path.join(folder, "model.onnx")
+
+    print(f"📦 Exporting {model_name} → {onnx_path}")
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    auto_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    input_names = [n for n in tokenizer.model_input_names
+                   if n in ("input_ids", "attention_mask", "token_type_ids")]
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    args = tuple(sample[n] for n in input_names)
+    dynamic_axes = {n: {0: "batch", 1: "sequence"} for n in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _Wrapper(auto_model),
+            args,
+            onnx_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+
+    tokenizer.save_pretrained(folder)
+    normalize = any(type(m).__name__ == "Normalize" for m in st_model)
+    config = {
+        "model_name": model_name,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "normalize": normalize,
+    }
+    with open(os.path.join(folder, "encoder_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    print(f"✅ Exported ONNX model → {onnx_path}")
+    return onnx_path
+
+
+def quantize_onnx(model_name=DEFAULT_MODEL):
+    """Dynamically quantise the exported fp32 ONNX model to int8 weights."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    folder = model_dir(model_name)
+    fp32_path = os.path.join(folder, "model.onnx")
+    int8_path = os.path.join(folder, "model-int8.onnx")
+    if not os.path.exists(fp32_path):
+        raise FileNotFoundError(f"Export the fp32 model first: {fp32_path}")
+
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"✅ Quantized int8 model → {int8_path}")
+    return int8_path
+
+
+def _time_encode(model, sentences, repeats=5):
+    """Mean seconds per encode() call of `sentences` on an already warm model."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.encode(sentences)
+    return (time.perf_counter() - start) / repeats
+
+
+def tune_threads(model_name=DEFAULT_MODEL, backend="onnx", sentences=None):
+    """
+    Time encode() at 1, 2, 4, ... available_cpus() threads and return the
+    fastest setting (use it as EMBED_THREADS).
+    """
+    sentences = sentences or PARITY_SENTENCES * 6
+    counts = sorted({min(2 ** i, available_cpus()) for i in range(8)})
+    timings = {}
+    for threads in counts:
+        model = load_encoder(model_name, backend, threads=threads)
+        model.encode(sentences)  # warm-up
+        timings[threads] = _time_encode(model, sentences)
+        print(f"   {threads:>3} threads: {timings[threads] * 1000:.1f} ms per batch")
+    best = min(timings, key=timings.get)
+    print(f"✅ Fastest: EMBED_THREADS={best}")
+    return best
+
+
+def check_parity(model_name=DEFAULT_MODEL, backend="onnx", sentences=None,
+                 tolerance=None, threads=None):
+    """
+    Compare ONNX embeddings against the PyTorch SentenceTransformer.
+
+    Returns (passed, min_cosine, mean_cosine, speedup).
+    """
+    import numpy as np
+
+    sentences = sentences or PARITY_SENTENCES
+    tolerance = tolerance if tolerance is not None else PARITY_TOLERANCE[backend]
+
+    torch_model = load_encoder(model_name, "torch")
+    onnx_model = load_encoder(model_name, backend, threads=threads)
+
+    # The first call pays one-off start-up costs; warm both before timing
+    reference = np.asarray(torch_model.encode(sentences), dtype="float32")
+    candidate = onnx_model.encode(sentences)
+    torch_time = _time_encode(torch_model, sentences)
+    onnx_time = _time_encode(onnx_model, sentences)
+
+    cos = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    min_cos, mean_cos = float(cos.min()), float(cos.mean())
+    speedup = torch_time / onnx_time if onnx_time else float("inf")
+    passed = min_cos >= tolerance
+
+    status = "✅" if passed else "❌"
+    print(f"{status} {backend} parity: min cosine {min_cos:.5f}, mean {mean_cos:.5f} "
+          f"(tolerance {tolerance}), {speedup:.2f}x vs torch")
+    return passed, min_cos, mean_cos, speedup
+
+
+# ---------------------------------------------------------
+#  Main execution
+# ---------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / quantize / check the ONNX encoder")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--export", action="store_true", help="Export fp32 ONNX model")
+    parser.add_argument("--quantize", action="store_true", help="Create dynamic int8 model")
+    parser.add_argument("--check", action="store_true", help="Check parity against PyTorch")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="ONNX Runtime intra-op threads (default: EMBED_THREADS or available CPUs)")
+    parser.add_argument("--tune", action="store_true", help="Measure the fastest thread count")
+    args = parser.parse_args()
+
+    if args.export:
+        export_onnx(args.model)
+    if args.quantize:
+        quantize_onnx(args.model)
+    if args.tune:
+        tune_threads(args.model)
+    if args.check:
+        results = [check_parity(args.model, "onnx", threads=args.threads)[0]]
+        if os.path.exists(os.path.join(model_dir(args.model), "model-int8.onnx")):
+            results.append(check_parity(args.model, "onnx-int8", threads=args.threads)[0])
+        if not all(results):
+            raise SystemExit(1)
@@ -0,0 +1,86 @@
+import json
+import os
+
+import metrics
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+# Documents searched at the chunk level per query (0 = flat search)
+TOP_DOCS = 5
+
+
+# ---------------------------------------------------------
+#  Two-level (document → chunk) search
+# ---------------------------------------------------------
+
+class DocumentHierarchy:
+    """
+    Document-level index plus chunk vectors grouped by document.
+
+    A query first picks the `top_docs` closest document centroids, then
+    scores only the chunks of those documents, so the cost grows with the
+    number of documents rather than the number of chunks.
+    """
+
+    def __init__(self, doc_index, doc_chunks, chunk_vectors):
+        import numpy as np
+
+        self.doc_index = doc_index
+        self.doc_chunks = [np.asarray(d["chunk_ids"], dtype="int64") for d in doc_chunks]
+        self.doc_names = [d["filename"] for d in doc_chunks]
+        self.chunk_vectors = chunk_vectors
+
+    @property
+    def n_documents(self):
+        return len(self.doc_chunks)
+
+    def search(self, query_vectors, k, top_docs=TOP_DOCS):
+        """Same contract as faiss index.search: returns (D, I), padded with -1."""
+        import numpy as np
+
+        query_vectors = np.ascontiguousarray(query_vectors, dtype="float32")
+        n = query_vectors.shape[0]
+        D = np.full((n, k), -np.inf, dtype="float32")
+        I = np.full((n, k), -1, dtype="int64")
+
+        with metrics.timer("query.search_documents"):
+            _, doc_ids = self.doc_index.search(query_vectors, min(top_docs, self.n_documents))
+
+        with metrics.timer("query.search_chunks"):
+            for row, docs in enumerate(doc_ids):
+                chunk_lists = [self.doc_chunks[d] for d in docs if d != -1]
+                if not chunk_lists:
+                    continue
+                candidates = np.concatenate(chunk_lists)
+                scores = self.chunk_vectors[candidates] @ query_vectors[row]
+                top = min(k, len(candidates))
+                best = np.argpartition(-scores, top - 1)[:top]
+                best = best[np.argsort(-scores[best])]
+                D[row, :top] = scores[best]
+                I[row, :top] = candidates[best]
+                metrics.inc("query.chunks_scored", len(candidates))
+        return D, I
+
+
+def load_hierarchy(index_dir, prefix, chunk_index):
+    """
+    Load {prefix}_doc_faiss.index + {prefix}_doc_chunks.json (written by
+    database.py) for an already loaded chunk index.
+
+    Returns None if the document level hasn't been built yet.
+    """
+    import faiss
+
+    doc_index_path = os.path.join(index_dir, f"{prefix}_doc_faiss.index")
+    doc_map_path = os.path.join(index_dir, f"{prefix}_doc_chunks.json")
+    if not os.path.exists(doc_index_path) or not os.path.exists(doc_map_path):
+        return None
+
+    with metrics.timer("query.load_hierarchy"):
+        doc_index = faiss.read_index(doc_index_path)
+        with open(doc_map_path, "r", encoding="utf-8") as f:
+            doc_chunks = json.load(f)
+        chunk_vectors = chunk_index.reconstruct_n(0, chunk_index.ntotal)
+    return DocumentHierarchy(doc_index, doc_chunks, chunk_vectors)
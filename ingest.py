@@ -0,0 +1,288 @@
+import argparse
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import database
+import metrics
+from make_embeddings import clean_text, detect_encoding, get_model, prepare_chunks
+from merge_embeddings import clean_bidi_chars
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+DOCUMENTS_DIR = database.DOCUMENTS_DIR
+MERGED_DIR = database.MERGED_DIR
+
+# Max items waiting between two stages; keeps memory bounded while letting
+# extraction of document N+1 overlap with embedding of document N
+QUEUE_SIZE = 4
+
+LANG_NAMES = {"en": "english", "ur": "urdu"}
+
+_DONE = object()
+
+
+# ---------------------------------------------------------
+#  Stages
+# ---------------------------------------------------------
+
+def discover_sources(docs_dir=DOCUMENTS_DIR):
+    """
+    Yield (category, path, kind) for every document to ingest.
+
+    .txt files are used as-is; PDFs are only extracted when they have no
+    .txt next to them (same rule as convert_pdf_to_text.py).
+    """
+    for category in sorted(os.listdir(docs_dir)):
+        category_path = os.path.join(docs_dir, category)
+        if not os.path.isdir(category_path):
+            continue
+        files = sorted(os.listdir(category_path))
+        for file in files:
+            path = os.path.join(category_path, file)
+            if file.endswith(".txt"):
+                yield category, path, "txt"
+            elif file.lower().endswith(".pdf") and \
+                    os.path.splitext(file)[0] + ".txt" not in files:
+                yield category, path, "pdf"
+
+
+def extract(source, translate=False, checkpoint=False):
+    """Stage 1: read/extract text → yields (category, txt_filename, text)."""
+    category, path, kind = source
+    metrics.inc("ingest.bytes", os.path.getsize(path))
+    if kind == "txt":
+        with open(path, "r", encoding=detect_encoding(path), errors="ignore") as f:
+            yield category, os.path.basename(path), f.read().strip()
+        return
+
+    from convert_pdf_to_text import extract_pdf_text
+
+    base = os.path.splitext(path)[0]
+    text = extract_pdf_text(path).strip()
+    if checkpoint:
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(text)
+    yield category, os.path.basename(base) + ".txt", text
+
+    urdu_path = base + "_urdu.txt"
+    if translate and text and not os.path.exists(urdu_path):
+        from convert_to_urdu import translate_large_text
+
+        urdu_text = translate_large_text(text)
+        if checkpoint:
+            with open(urdu_path, "w", encoding="utf-8") as f:
+                f.write(urdu_text)
+        yield category, os.path.basename(urdu_path), urdu_text
+
+
+def chunk(doc):
+    """Stage 2: clean + chunk + per-chunk language detection."""
+    category, filename, text = doc
+    text = clean_text(text)
+    if len(text) < 50:
+        return
+    kept = prepare_chunks(text)
+    if kept:
+        yield category, filename, kept
+
+
+def embed(doc):
+    """Stage 3: encode every kept chunk of a document in one call."""
+    category, filename, kept = doc
+    with metrics.timer("embed.encode"):
+        vectors = np.asarray(get_model().encode([c for _, c, _ in kept]), dtype="float32")
+    metrics.inc("embed.chunks", len(kept))
+    yield category, filename, kept, vectors
+
+
+class IndexWriter:
+    """Stage 4: insert vectors into per-language FAISS indexes as they arrive."""
+
+    def __init__(self):
+        self.indexes = {}
+        self.rows = {}
+        self.vectors = {}
+
+    def add(self, doc):
+        import faiss
+
+        category, filename, kept, vectors = doc
+        for lang_code in LANG_NAMES:
+            mask = [i for i, (_, _, lang) in enumerate(kept) if lang == lang_code]
+            if not mask:
+                continue
+            lang = LANG_NAMES[lang_code]
+            vecs = vectors[mask]
+            normalized = np.ascontiguousarray(vecs.copy())
+            faiss.normalize_L2(normalized)  # cosine similarity
+            if lang not in self.indexes:
+                self.indexes[lang] = faiss.IndexFlatIP(vecs.shape[1])
+                self.rows[lang], self.vectors[lang] = [], []
+            self.indexes[lang].add(normalized)
+            self.vectors[lang].append(vecs)
+            for i in mask:
+                chunk_id, text, _ = kept[i]
+                if lang == "urdu":
+                    text = clean_bidi_chars(text)
+                self.rows[lang].append({
+                    "category": category,
+                    "filename": filename,
+                    "chunk_id": chunk_id,
+                    "language": lang_code,
+                    "text": text,
+                })
+
+    def save(self, checkpoint=False):
+        for lang, index in self.indexes.items():
+            metadata = database.build_metadata(lang, self.rows[lang])
+            database.save_index(lang, index, metadata)
+            if checkpoint:
+                save_merged(lang, self.rows[lang], np.vstack(self.vectors[lang]))
+
+
+def save_merged(lang, rows, vectors):
+    """Write merged CSV + NPY in merge_embeddings.py's format (database.py can rebuild from it)."""
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    emb = pd.DataFrame(vectors, columns=[f"emb_{j}" for j in range(vectors.shape[1])])
+    df = pd.concat([df, emb], axis=1)
+
+    os.makedirs(MERGED_DIR, exist_ok=True)
+    df.to_csv(os.path.join(MERGED_DIR, f"{lang}_embeddings_merged.csv"),
+              index=False, encoding="utf-8-sig")
+    np.save(os.path.join(MERGED_DIR, f"{lang}_vectors_merged.npy"), vectors)
+    print(f"💾 Merged arrays saved for {lang} ({len(df)} chunks)")
+
+
+# ---------------------------------------------------------
+#  Pipeline plumbing
+# ---------------------------------------------------------
+
+def _describe(item):
+    """category/filename of a pipeline item, for error messages."""
+    return f"{item[0]}/{os.path.basename(item[1])}"
+
+
+def _stage(name, fn, inbox, outbox, failed):
+    """
+    Run `fn` over items from `inbox`, forwarding outputs to `outbox`.
+
+    Each item's processing time (excluding time blocked on a full `outbox`)
+    is recorded as ingest.<name>. A document that raises is logged,
+    recorded in `failed` and skipped; the stage carries on with the next one.
+    """
+    try:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            elapsed = 0.0
+            start = time.perf_counter()
+            try:
+                for out in fn(item):
+                    elapsed += time.perf_counter() - start
+                    outbox.put(out)
+                    start = time.perf_counter()
+            except Exception as e:
+                print(f"   ❌ {name} failed for {_describe(item)}: {e}")
+                failed.append((name, _describe(item), e))
+                metrics.inc(f"ingest.{name}_errors")
+                continue
+            finally:
+                metrics.observe(f"ingest.{name}", elapsed + time.perf_counter() - start)
+            metrics.inc(f"ingest.{name}_items")
+    finally:
+        outbox.put(_DONE)
+
+
+def run_pipeline(docs_dir=DOCUMENTS_DIR, translate=False, checkpoint=False, queue_size=QUEUE_SIZE):
+    """Extract → chunk → embed → index, each stage in its own thread."""
+    start = time.perf_counter()
+    sources = queue.Queue(maxsize=queue_size)
+    texts = queue.Queue(maxsize=queue_size)
+    chunks = queue.Queue(maxsize=queue_size)
+    embedded = queue.Queue(maxsize=queue_size)
+    errors = []  # fatal: document discovery
+    failed = []  # per-document: (stage, document, exception)
+
+    stages = [
+        ("extract", lambda s: extract(s, translate, checkpoint), sources, texts),
+        ("chunk", chunk, texts, chunks),
+        ("embed", embed, chunks, embedded),
+    ]
+    threads = [threading.Thread(target=_stage, args=(name, fn, inbox, outbox, failed),
+                                name=f"ingest-{name}", daemon=True)
+               for name, fn, inbox, outbox in stages]
+    for t in threads:
+        t.start()
+
+    def feed():
+        try:
+            for source in discover_sources(docs_dir):
+                sources.put(source)
+        except Exception as e:
+            errors.append(("discover", e))
+        finally:
+            sources.put(_DONE)
+
+    threading.Thread(target=feed, name="ingest-discover", daemon=True).start()
+
+    # Index insertion runs on the main thread as the last stage
+    writer = IndexWriter()
+    docs = total_chunks = 0
+    while True:
+        doc = embedded.get()
+        if doc is _DONE:
+            break
+        t0 = time.perf_counter()
+        try:
+            writer.add(doc)
+        except Exception as e:
+            print(f"   ❌ index failed for {_describe(doc)}: {e}")
+            failed.append(("index", _describe(doc), e))
+            metrics.inc("ingest.index_errors")
+            continue
+        finally:
+            metrics.observe("ingest.index", time.perf_counter() - t0)
+        metrics.inc("ingest.docs")
+        docs += 1
+        total_chunks += len(doc[2])
+        print(f"   ✅ {doc[1]} ({len(doc[2])} chunks)")
+
+    for t in threads:
+        t.join()
+    if errors:
+        for name, e in errors:
+            print(f"❌ {name} stage failed: {e}")
+        raise RuntimeError(f"Ingest failed in stage(s): {', '.join(n for n, _ in errors)}")
+
+    writer.save(checkpoint)
+    elapsed = time.perf_counter() - start
+    print(f"\n🎉 Ingested {docs} documents / {total_chunks} chunks in {elapsed:.1f}s")
+    if failed:
+        print(f"⚠️ {len(failed)} document(s) failed and were skipped:")
+        for name, doc_name, e in failed:
+            print(f"   {doc_name} ({name}): {e}")
+    print("⏱️ Stage timings:\n" + metrics.summary())
+    return writer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming PDF → FAISS ingest pipeline")
+    parser.add_argument("--docs-dir", default=DOCUMENTS_DIR)
+    parser.add_argument("--translate", action="store_true",
+                        help="Translate extracted English PDFs to Urdu (network)")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Also write extracted .txt files and merged CSV/NPY checkpoints")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    args = parser.parse_args()
+
+    with metrics.profiled("ingest"):
+        run_pipeline(args.docs_dir, args.translate, args.checkpoint, args.queue_size)
@@ -4,20 +4,31 @@ import pandas as pd
 import numpy as np
 from tqdm import tqdm
 from langdetect import detect
-from sentence_transformers import SentenceTransformer
+from encoder import load_encoder
 from chardet import detect as chardet_detect
 
+import metrics
+# Model + chunking are shared with build.py
+from pipeline_config import CHUNK_SIZE, MODEL_NAME, OVERLAP
+
 # --- CONFIG ---
 BASE_DIR = r"C:\Users\Dell-5420\Downloads\fyp_github\fyp_text\text_pdfs"
-CHUNK_SIZE = 500
-OVERLAP = 100
 BATCH_SIZE = 30
 OUTPUT_DIR = "embeddings_output"
 
 # --- Load multilingual model (supports Urdu + English) ---
-model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+# Backend is picked by EMBED_BACKEND: "torch" (default), "onnx" or "onnx-int8"
+_model = None
+
+def get_model():
+    """Load the embedding model on first use and cache it."""
+    global _model
+    if _model is None:
+        _model = load_encoder(MODEL_NAME)
+    return _model
 
 # --- Helpers ---
+@metrics.timed("embed.chardet")
 def detect_encoding(file_path):
     with open(file_path, 'rb') as f:
         raw_data = f.read(20000)
@@ -60,6 +71,7 @@ def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=OVERLAP):
         start += (chunk_size - overlap)
     return chunks
 
+@metrics.timed("embed.clean_text")
 def clean_text(text):
     replacements = {
         "â€¢": "•", "â€“": "–", "â€”": "—", "â€˜": "‘", "â€™": "’",
@@ -71,86 +83,109 @@ def clean_text(text):
         text = text.replace(bad, good)
     return text
 
-# --- Batch Processing ---
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-all_txt_files = []
-for category in os.listdir(BASE_DIR):
-    category_path = os.path.join(BASE_DIR, category)
-    if not os.path.isdir(category_path):
-        continue
-    for file in os.listdir(category_path):
-        if file.endswith(".txt"):
-            all_txt_files.append((category, os.path.join(category_path, file)))
-
-print(f"🔹 Total text files found: {len(all_txt_files)}")
-
-batch_count = (len(all_txt_files) // BATCH_SIZE) + 1
-
-for batch_num in range(batch_count):
-    start_idx = batch_num * BATCH_SIZE
-    end_idx = min((batch_num + 1) * BATCH_SIZE, len(all_txt_files))
-    batch_files = all_txt_files[start_idx:end_idx]
-
-    urdu_records, english_records = [], []
-
-    print(f"\n⚙️ Processing batch {batch_num + 1}/{batch_count} "
-          f"({len(batch_files)} files)...")
-
-    for category, file_path in tqdm(batch_files, desc=f"Batch {batch_num+1}"):
-        file = os.path.basename(file_path)
-        encoding = detect_encoding(file_path)
-
-        with open(file_path, "r", encoding=encoding, errors="ignore") as f:
-            text = f.read().strip()
-
-        text = clean_text(text)
-        if len(text) < 50:
+@metrics.timed("embed.chunk")
+def prepare_chunks(text):
+    """Chunk cleaned text and keep (chunk_id, chunk, lang) for Urdu/English chunks."""
+    kept = []
+    for i, chunk in enumerate(chunk_text(text)):
+        lang = detect_language_per_chunk(chunk)
+        if lang not in ['ur', 'en']:
+            continue  # skip other or unknown languages
+        kept.append((i, chunk, lang))
+    return kept
+
+def main():
+    # --- Batch Processing ---
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    all_txt_files = []
+    for category in os.listdir(BASE_DIR):
+        category_path = os.path.join(BASE_DIR, category)
+        if not os.path.isdir(category_path):
             continue
-
-        chunks = chunk_text(text)
-
-        for i, chunk in enumerate(chunks):
-            lang = detect_language_per_chunk(chunk)
-            if lang not in ['ur', 'en']:
-                continue  # skip other or unknown languages
-
-            embedding = model.encode(chunk)
-            record = {
-                "category": category,
-                "filename": file,
-                "chunk_id": i,
-                "language": lang,
-                "text": chunk
-            }
-            for j, val in enumerate(embedding):
-                record[f"emb_{j}"] = val
-
-            if lang == 'ur':
-                urdu_records.append(record)
-            elif lang == 'en':
-                english_records.append(record)
-
-    # --- Save Urdu ---
-    if urdu_records:
-        urdu_df = pd.DataFrame(urdu_records)
-        urdu_csv = os.path.join(OUTPUT_DIR, f"urdu_embeddings_batch_{batch_num+1}.csv")
-        urdu_df.to_csv(urdu_csv, index=False, encoding="utf-8-sig")
-
-        urdu_vectors = urdu_df.filter(like='emb_').to_numpy()
-        np.save(os.path.join(OUTPUT_DIR, f"urdu_vectors_batch_{batch_num+1}.npy"), urdu_vectors)
-        print(f"Urdu batch {batch_num+1} saved ({len(urdu_df)} chunks)")
-
-    # --- Save English ---
-    if english_records:
-        eng_df = pd.DataFrame(english_records)
-        eng_csv = os.path.join(OUTPUT_DIR, f"english_embeddings_batch_{batch_num+1}.csv")
-        eng_df.to_csv(eng_csv, index=False, encoding="utf-8-sig")
-
-        eng_vectors = eng_df.filter(like='emb_').to_numpy()
-        np.save(os.path.join(OUTPUT_DIR, f"english_vectors_batch_{batch_num+1}.npy"), eng_vectors)
-        print(f"English batch {batch_num+1} saved ({len(eng_df)} chunks)")
-
-    del urdu_records, english_records
-
-print("\n🎉 All batches processed successfully!")
+        for file in os.listdir(category_path):
+            if file.endswith(".txt"):
+                all_txt_files.append((category, os.path.join(category_path, file)))
+
+    print(f"🔹 Total text files found: {len(all_txt_files)}")
+
+    batch_count = (len(all_txt_files) // BATCH_SIZE) + 1
+
+    for batch_num in range(batch_count):
+        start_idx = batch_num * BATCH_SIZE
+        end_idx = min((batch_num + 1) * BATCH_SIZE, len(all_txt_files))
+        batch_files = all_txt_files[start_idx:end_idx]
+
+        urdu_records, english_records = [], []
+
+        print(f"\n⚙️ Processing batch {batch_num + 1}/{batch_count} "
+              f"({len(batch_files)} files)...")
+
+        for category, file_path in tqdm(batch_files, desc=f"Batch {batch_num+1}"):
+            file = os.path.basename(file_path)
+            encoding = detect_encoding(file_path)
+
+            with open(file_path, "r", encoding=encoding, errors="ignore") as f:
+                text = f.read().strip()
+            metrics.inc("embed.docs")
+            metrics.inc("embed.bytes", os.path.getsize(file_path))
+
+            text = clean_text(text)
+            if len(text) < 50:
+                continue
+
+            # Detect languages first so all kept chunks are encoded in one batch
+            kept = prepare_chunks(text)
+            if not kept:
+                continue
+            with metrics.timer("embed.encode"):
+                embeddings = get_model().encode([chunk for _, chunk, _ in kept])
+            metrics.inc("embed.chunks", len(kept))
+
+            for (i, chunk, lang), embedding in zip(kept, embeddings):
+                record = {
+                    "category": category,
+                    "filename": file,
+                    "chunk_id": i,
+                    "language": lang,
+                    "text": chunk
+                }
+                for j, val in enumerate(embedding):
+                    record[f"emb_{j}"] = val
+
+                if lang == 'ur':
+                    urdu_records.append(record)
+                elif lang == 'en':
+                    english_records.append(record)
+
+        # --- Save Urdu ---
+        if urdu_records:
+            with metrics.timer("embed.write"):
+                urdu_df = pd.DataFrame(urdu_records)
+                urdu_csv = os.path.join(OUTPUT_DIR, f"urdu_embeddings_batch_{batch_num+1}.csv")
+                urdu_df.to_csv(urdu_csv, index=False, encoding="utf-8-sig")
+
+                urdu_vectors = urdu_df.filter(like='emb_').to_numpy()
+                np.save(os.path.join(OUTPUT_DIR, f"urdu_vectors_batch_{batch_num+1}.npy"), urdu_vectors)
+            print(f"Urdu batch {batch_num+1} saved ({len(urdu_df)} chunks)")
+
+        # --- Save English ---
+        if english_records:
+            with metrics.timer("embed.write"):
+                eng_df = pd.DataFrame(english_records)
+                eng_csv = os.path.join(OUTPUT_DIR, f"english_embeddings_batch_{batch_num+1}.csv")
+                eng_df.to_csv(eng_csv, index=False, encoding="utf-8-sig")
+
+                eng_vectors = eng_df.filter(like='emb_').to_numpy()
+                np.save(os.path.join(OUTPUT_DIR, f"english_vectors_batch_{batch_num+1}.npy"), eng_vectors)
+            print(f"English batch {batch_num+1} saved ({len(eng_df)} chunks)")
+
+        del urdu_records, english_records
+
+    print("\n🎉 All batches processed successfully!")
+    print("⏱️ Stage timings:\n" + metrics.summary())
+
+
+if __name__ == "__main__":
+    with metrics.profiled("make_embeddings"):
+        main()
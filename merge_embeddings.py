@@ -5,10 +5,13 @@ import pandas as pd
 import re
 import chardet
 
+import metrics
+
 # ---------------------------------------------------------
 #  Helper functions
 # ---------------------------------------------------------
 
+@metrics.timed("merge.chardet")
 def detect_encoding(filepath):
     """Detect file encoding using chardet."""
     with open(filepath, 'rb') as f:
@@ -17,6 +20,7 @@ def detect_encoding(filepath):
     return result['encoding'] or 'utf-8-sig'
 
 
+@metrics.timed("merge.read_csv")
 def read_csv_safely(filepath):
     """Read CSV file safely with detected encoding."""
     enc = detect_encoding(filepath)
@@ -78,9 +82,11 @@ def merge_embeddings(language):
     os.makedirs(output_dir, exist_ok=True)
 
     # Save merged files
-    merged_df.to_csv(f"{output_dir}/{language}_embeddings_merged.csv",
-                     index=False, encoding="utf-8-sig")
-    np.save(f"{output_dir}/{language}_vectors_merged.npy", merged_vecs)
+    with metrics.timer("merge.write"):
+        merged_df.to_csv(f"{output_dir}/{language}_embeddings_merged.csv",
+                         index=False, encoding="utf-8-sig")
+        np.save(f"{output_dir}/{language}_vectors_merged.npy", merged_vecs)
+    metrics.inc("merge.chunks", len(merged_df))
 
     print(f"✅ {language.capitalize()} merged: {len(merged_df)} records successfully saved.")
 
@@ -0,0 +1,212 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+# Set PQNK_METRICS to a file path to export metrics when the process exits:
+# "*.prom" → Prometheus text format, anything else → one JSON line per run
+METRICS_FILE = os.environ.get("PQNK_METRICS")
+
+# Set PQNK_PROFILE=1 to dump cProfile data for each profiled run
+PROFILE = os.environ.get("PQNK_PROFILE", "") not in ("", "0")
+PROFILE_DIR = os.environ.get("PQNK_PROFILE_DIR", "profiles")
+
+PREFIX = "pqnk"
+
+
+# ---------------------------------------------------------
+#  Registry
+# ---------------------------------------------------------
+
+class Registry:
+    """Thread-safe store of stage timers and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timers = {}    # name → {"count", "total_s", "max_s"}
+        self.counters = {}  # name → value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            t = self.timers.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            t["count"] += 1
+            t["total_s"] += seconds
+            t["max_s"] = max(t["max_s"], seconds)
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "timers": {k: dict(v) for k, v in self.timers.items()},
+                "counters": dict(self.counters),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+
+REGISTRY = Registry()
+
+
+@contextlib.contextmanager
+def timer(name):
+    """Time a block and record it under `name` (e.g. "ingest.encode")."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator form of `timer`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inc(name, value=1):
+    """Increment a counter (docs, chunks, bytes, cache hits, retries, ...)."""
+    REGISTRY.inc(name, value)
+
+
+def observe(name, seconds):
+    """Record a duration measured elsewhere."""
+    REGISTRY.observe(name, seconds)
+
+
+# ---------------------------------------------------------
+#  Exporters
+# ---------------------------------------------------------
+
+def _metric_name(name):
+    return PREFIX + "_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def to_prometheus(snapshot=None):
+    """Render a snapshot in the Prometheus text exposition format."""
+    snapshot = snapshot or REGISTRY.snapshot()
+    lines = []
+    for name, t in sorted(snapshot["timers"].items()):
+        metric = _metric_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        lines.append(f"{metric}_count {t['count']}")
+        lines.append(f"{metric}_sum {t['total_s']:.6f}")
+        lines.append(f"# TYPE {metric}_max gauge")
+        lines.append(f"{metric}_max {t['max_s']:.6f}")
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def to_json_line(run=None, snapshot=None):
+    """Render a snapshot as one JSON line (for appending to a log)."""
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "run": run,
+        **(snapshot or REGISTRY.snapshot()),
+    }
+    return json.dumps(record, ensure_ascii=False)
+
+
+def export(path=None, run=None):
+    """Write metrics to `path` (Prometheus text if *.prom, else append JSON line)."""
+    path = path or METRICS_FILE
+    if not path:
+        return
+    if path.endswith(".prom"):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(to_prometheus())
+    else:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(to_json_line(run) + "\n")
+
+
+def summary():
+    """Short human-readable table of the slowest stages."""
+    snap = REGISTRY.snapshot()
+    rows = sorted(snap["timers"].items(), key=lambda kv: -kv[1]["total_s"])
+    lines = [f"   {name:<28} {t['total_s']:8.2f}s  ×{t['count']}" for name, t in rows]
+    lines += [f"   {name:<28} {value}" for name, value in sorted(snap["counters"].items())]
+    return "\n".join(lines)
+
+
+if METRICS_FILE:
+    atexit.register(export)
+
+
+# ---------------------------------------------------------
+#  Profiling
+# ---------------------------------------------------------
+
+@contextlib.contextmanager
+def profiled(run, enabled=None):
+    """
+    Profile a block with cProfile when PQNK_PROFILE is set (or enabled=True).
+
+    Writes <PROFILE_DIR>/<run>-<timestamp>.prof, loadable with pstats,
+    snakeviz or flameprof (for a flame graph SVG), plus a .txt summary of
+    the top functions by cumulative time.
+
+    Threads started inside the block (e.g. the ingest stages) are included.
+    Since Python 3.12 cProfile sees every thread by itself; before that
+    each new thread gets its own profiler and the stats are merged.
+    """
+    enabled = PROFILE if enabled is None else enabled
+    if not enabled:
+        yield
+        return
+
+    import cProfile
+    import pstats
+
+    thread_profilers = []
+
+    def profile_thread(*_):
+        # Installed via threading.setprofile: runs once as each new thread
+        # starts and replaces itself with a per-thread cProfile
+        thread_profiler = cProfile.Profile()
+        thread_profilers.append(thread_profiler)
+        thread_profiler.enable()
+
+    per_thread = sys.version_info < (3, 12)
+    profiler = cProfile.Profile()
+    if per_thread:
+        threading.setprofile(profile_thread)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(profiler)
+        for thread_profiler in thread_profilers:
+            stats.add(thread_profiler)
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{run}-{time.strftime('%Y%m%d-%H%M%S')}")
+        stats.dump_stats(base + ".prof")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            stats.stream = f
+            stats.sort_stats("cumulative").print_stats(40)
+        print(f"🧪 Profile saved → {base}.prof")
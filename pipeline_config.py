@@ -0,0 +1,23 @@
+# Settings shared by the PDF → FAISS scripts. This module must not import
+# any third-party package: build.py reads it to plan a build (--dry-run)
+# without loading pandas, faiss, fitz or the translators.
+
+# --- Paths ---
+DOCUMENTS_DIR = "text_pdfs"  # where PDFs are stored
+MERGED_DIR = "embeddings_output/merged"
+FAISS_DIR = "faiss_indexes"
+
+# --- Base URL where PDFs are hosted ---
+BASE_URL = "https://yourdomain.com/pdfs"
+
+# --- Chunking + embedding (make_embeddings.py) ---
+MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+CHUNK_SIZE = 500
+OVERLAP = 100
+
+# 📝 Urdu PDFs to translate to English (convert_urdu_to_eng.py)
+# (Use exact file names as they appear in your folder)
+TARGET_PDFS = {
+    "Advisory_Paper_Mango_Pruning_Urdu.pdf"
+    # Add more file names here...
+}
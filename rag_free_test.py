@@ -1,14 +1,22 @@
+import time
+_IMPORT_START = time.perf_counter()
+
+import argparse
 import os
 import json
-import faiss
-import numpy as np
-from langdetect import detect
-from sentence_transformers import SentenceTransformer
+import threading
+
+import context_builder
+import encoder
+import metrics
+import rerank
 
 # ---------------------------
 # 1. Detect language
 # ---------------------------
 def detect_language(text):
+    from langdetect import detect
+
     try:
         lang = detect(text)
         return "ur" if lang == "ur" else "en"
@@ -21,6 +29,8 @@ def detect_language(text):
 def load_faiss_index(path):
     if not os.path.exists(path):
         raise FileNotFoundError(f"FAISS index not found: {path}")
+    import faiss
+
     return faiss.read_index(path)
 
 # ---------------------------
@@ -29,55 +39,113 @@ def load_faiss_index(path):
 def load_metadata(path):
     if not os.path.exists(path):
         raise FileNotFoundError(f"Metadata file not found: {path}")
-    with open(path, "r", encoding="utf-8") as f:
+    with metrics.timer("query.load_metadata"), open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 # ---------------------------
 # 4. REAL embedding generator (offline)
 # ---------------------------
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Must match the model the stores were embedded with (make_embeddings.py)
+MODEL_NAME = encoder.DEFAULT_MODEL
+
+# Encoder backend: None uses EMBED_BACKEND ("torch", "onnx" or "onnx-int8")
+BACKEND = None
+
+# Documents searched at the chunk level (None = hierarchy.TOP_DOCS, 0 = flat)
+TOP_DOCS = None
+
+# Second stage: None uses RERANK_SCORER ("cross", "lexical" or "none"), and
+# the per-query millisecond budget covering encode + search + rerank
+RERANKER = None
+BUDGET_MS = None
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Load the embedding model on first use and cache it."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                start = time.perf_counter()
+                _model = encoder.load_encoder(MODEL_NAME, BACKEND)
+                print(f"⏱️ Model loaded in {time.perf_counter() - start:.2f}s")
+    return _model
 
 def get_real_embedding(text):
-    return model.encode(text, convert_to_numpy=True).astype("float32")
+    with metrics.timer("query.encode"):
+        return get_model().encode(text, convert_to_numpy=True).astype("float32")
 
 # ---------------------------
 # 5. Retrieve passages
 # ---------------------------
-def retrieve_passages(query_vec, index, metadata, top_k=4):
+def retrieve_passages(query_vec, index, metadata, top_k=4, query=None,
+                      budget=None, doc_hierarchy=None, top_docs=None):
+    """
+    FAISS search for top_k passages.
+
+    With a `doc_hierarchy` (see hierarchy.py) only the chunks of the
+    `top_docs` closest documents are searched.
+
+    If `query` text is given, a wider candidate set is fetched and reranked
+    (see rerank.py) before `budget` (a rerank.QueryBudget, started before
+    the query was encoded) runs out; on overrun only the candidates scored
+    so far are reordered and the rest keep their FAISS order.
+    """
+    import hierarchy
+
+    top_docs = top_docs if top_docs is not None else (TOP_DOCS if TOP_DOCS is not None else hierarchy.TOP_DOCS)
+    if budget is None:
+        budget = rerank.QueryBudget(RERANKER if query else "none", BUDGET_MS)
+    n_candidates = budget.n_candidates(top_k)
+
     query_vec = query_vec.reshape(1, -1).astype("float32")
-    distances, indices = index.search(query_vec, top_k)
+    with metrics.timer("query.search"):
+        if doc_hierarchy is not None and top_docs:
+            distances, indices = doc_hierarchy.search(query_vec, n_candidates, top_docs)
+        else:
+            distances, indices = index.search(query_vec, n_candidates)
 
     results = []
     for idx in indices[0]:
         if idx == -1:
             continue
         results.append(metadata[idx])
+
+    results, info = rerank.rerank(query, results, top_k, scorer=budget.scorer,
+                                  deadline=budget.deadline)
+    budget.report(info)
     return results
 
 # ---------------------------
 # 6. Build context for testing (optional, for debugging)
 # ---------------------------
-def build_context(passages):
-    ctx = ""
-    for i, p in enumerate(passages):
-        ctx += f"[Document {i+1}]\n{p['text']}\n\n"
-    return ctx
+def build_context(passages, adjacency=None, token_budget=context_builder.TOKEN_BUDGET):
+    """
+    Merge adjacent/overlapping chunks, order them by MMR and pack them into
+    `token_budget` (see context_builder.py).
+    """
+    spans = context_builder.assemble_context(passages, adjacency, token_budget)
+    return context_builder.format_context(spans)
 
 # ---------------------------
 # 7. Simplified answer (raw text from top passages)
 # ---------------------------
-def simple_answer(passages, char_limit=500):
+def simple_answer(passages, char_limit=500, adjacency=None):
     """
     Returns the text from the top passages without FAKE ANSWER boilerplate.
     """
     if not passages:
         return "⚠ No relevant documents found."
 
-    combined_text = ""
-    for p in passages:
-        combined_text += p["text"] + "\n\n"
+    with metrics.timer("query.assemble_context"):
+        spans = context_builder.assemble_context(passages, adjacency)
+    combined_text = "\n\n".join(s["text"] for s in spans)
 
-    # Limit output to char_limit
+    # Limit output to char_limit (cut at a word boundary)
+    if len(combined_text) > char_limit:
+        combined_text = combined_text[:char_limit].rsplit(" ", 1)[0] + " …"
     return combined_text
 
 # ---------------------------
@@ -90,29 +158,104 @@ file_lang_map = {
     "ur": "urdu"
 }
 
+_stores = {}  # file_prefix -> (index, metadata)
+_adjacency = {}  # file_prefix -> {(filename, chunk_id): record}
+_hierarchies = {}  # file_prefix -> DocumentHierarchy or None
+_store_lock = threading.Lock()
+
+def get_store(lang):
+    """Load (once) and return the FAISS index + metadata for a language."""
+    file_prefix = file_lang_map.get(lang, "english")  # fallback to english
+
+    if file_prefix in _stores:
+        metrics.inc("query.db_cache_hits")
+    else:
+        with _store_lock:
+            if file_prefix not in _stores:
+                index_path = os.path.join(BASE_DIR, f"{file_prefix}_faiss.index")
+                meta_path = os.path.join(BASE_DIR, f"{file_prefix}_metadata.json")
+
+                print(f"📁 Loading Index: {index_path}")
+                print(f"📁 Loading Metadata: {meta_path}")
+
+                start = time.perf_counter()
+                index = load_faiss_index(index_path)
+                print("FAISS index dimension:", index.d)
+                metadata = load_metadata(meta_path)
+                _adjacency[file_prefix] = context_builder.build_adjacency(metadata)
+
+                from hierarchy import load_hierarchy
+                _hierarchies[file_prefix] = load_hierarchy(BASE_DIR, file_prefix, index)
+                _stores[file_prefix] = (index, metadata)
+                print(f"⏱️ {file_prefix} store loaded in {time.perf_counter() - start:.2f}s")
+    return _stores[file_prefix]
+
+def get_hierarchy(lang):
+    """Document → chunk hierarchy for a language's store, or None."""
+    get_store(lang)
+    return _hierarchies[file_lang_map.get(lang, "english")]
+
+def get_adjacency(lang):
+    """(filename, chunk_id) adjacency index for a language's store."""
+    get_store(lang)
+    return _adjacency[file_lang_map.get(lang, "english")]
+
+def warmup(langs=("en", "ur")):
+    """Load model + stores and run a dummy encode/search for each language."""
+    start = time.perf_counter()
+    q_vec = get_real_embedding("warmup")
+    detect_language("warmup")
+    for lang in langs:
+        index, _ = get_store(lang)
+        index.search(q_vec.reshape(1, -1), 1)
+
+    if (RERANKER or rerank.DEFAULT_SCORER) == "cross":
+        rerank.warmup()
+    print(f"🔥 Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+def start_warmup(langs=("en", "ur")):
+    """
+    Run `warmup` in a daemon thread and return the thread.
+
+    An exception is kept on `thread.error` instead of being printed over the
+    prompt; join_warmup re-raises it, otherwise the first query hits it.
+    """
+    def run():
+        try:
+            warmup(langs)
+        except Exception as e:
+            thread.error = e
+
+    thread = threading.Thread(target=run, name="rag-warmup", daemon=True)
+    thread.error = None
+    thread.start()
+    return thread
+
+def join_warmup(thread):
+    """Wait for a start_warmup thread and re-raise anything it raised."""
+    thread.join()
+    if thread.error is not None:
+        raise thread.error
+
 def rag_pipeline(question):
     print(f"\n🔎 Received Question: {question}")
 
     lang = detect_language(question)
     print(f"🌐 Detected Language: {lang}")
 
-    file_prefix = file_lang_map.get(lang, "english")  # fallback to english
-
-    index_path = os.path.join(BASE_DIR, f"{file_prefix}_faiss.index")
-    meta_path = os.path.join(BASE_DIR, f"{file_prefix}_metadata.json")
+    index, metadata = get_store(lang)
+    doc_hierarchy = get_hierarchy(lang)
+    get_model()
 
-    print(f"📁 Loading Index: {index_path}")
-    print(f"📁 Loading Metadata: {meta_path}")
-
-    index = load_faiss_index(index_path)
-    print("FAISS index dimension:", index.d)
-    metadata = load_metadata(meta_path)
+    # The latency budget starts here, after one-off loading (see rerank.QueryBudget)
+    budget = rerank.QueryBudget(RERANKER, BUDGET_MS)
 
     # REAL embedding instead of fake
     q_vec = get_real_embedding(question)
 
     print("🔍 Retrieving passages...")
-    passages = retrieve_passages(q_vec, index, metadata)
+    passages = retrieve_passages(q_vec, index, metadata, query=question,
+                                 budget=budget, doc_hierarchy=doc_hierarchy)
 
     if not passages:
         return "⚠ No relevant documents found in FAISS."
@@ -126,20 +269,64 @@ def rag_pipeline(question):
 
     # 🧠 Generate simplified answer from top passages
     print("🧠 Generating simplified answer...")
-    answer = simple_answer(passages)
+    answer = simple_answer(passages, adjacency=get_adjacency(lang))
 
     return answer
 
 # ---------------------------
 # Run testing mode
 # ---------------------------
-if __name__ == "__main__":
-    print("🚀 FREE RAG TESTING MODE (Offline, No API Required)\n")
-
+def ask_loop():
+    """Interactive prompt: answer questions until 'exit'."""
+    first_query = True
     while True:
         q = input("Ask something (or 'exit'): ")
         if q.lower() == "exit":
             break
 
-        print("\n" + rag_pipeline(q))
+        start = time.perf_counter()
+        answer = rag_pipeline(q)
+        if first_query:
+            print(f"⏱️ First query answered in {time.perf_counter() - start:.3f}s")
+            first_query = False
+
+        print("\n" + answer)
         print("\n" + "-"*80 + "\n")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline RAG testing mode")
+    parser.add_argument("--warmup", action="store_true",
+                        help="Block until a dummy encode + search has run for both languages")
+    parser.add_argument("--backend", choices=["torch", "onnx", "onnx-int8"],
+                        help="Query encoder backend (default: EMBED_BACKEND or torch)")
+    parser.add_argument("--rerank", choices=["cross", "lexical", "none"],
+                        help="Second-stage reranker (default: RERANK_SCORER or lexical)")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Per-query latency budget in milliseconds")
+    parser.add_argument("--top-docs", type=int, default=None,
+                        help="Documents to search at chunk level (0 = flat search)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    print(f"⏱️ Imports finished in {time.perf_counter() - _IMPORT_START:.3f}s")
+    args = parse_args()
+    BACKEND = args.backend
+    RERANKER = args.rerank
+    BUDGET_MS = args.budget_ms
+    TOP_DOCS = args.top_docs
+
+    print("🚀 FREE RAG TESTING MODE (Offline, No API Required)\n")
+
+    # Warm up in the background while waiting for the first question;
+    # with --warmup we wait for it so the first answer is fully warm.
+    warmup_thread = start_warmup()
+    if args.warmup:
+        try:
+            join_warmup(warmup_thread)
+        except Exception as e:
+            print(f"❌ Warm-up failed: {e}")
+            exit()
+        print(f"⏱️ Ready after {time.perf_counter() - _IMPORT_START:.2f}s\n")
+
+    with metrics.profiled("rag_free_test"):
+        ask_loop()
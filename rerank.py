@@ -0,0 +1,249 @@
+import os
+import re
+import threading
+import time
+
+import metrics
+
+# ---------------------------------------------------------
+#  Configuration
+# ---------------------------------------------------------
+
+# Multilingual (incl. Urdu) passage reranker
+CROSS_ENCODER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+# "cross" (cross-encoder), "lexical" (term overlap) or "none" (first stage only).
+# "cross" downloads a second model on first use, so it is opt-in.
+SCORERS = ("cross", "lexical", "none")
+DEFAULT_SCORER = os.environ.get("RERANK_SCORER", "lexical")
+
+# Used instead of "cross" when the cross-encoder can't be loaded
+FALLBACK_SCORER = "lexical"
+
+# How many first-stage candidates to rerank, and the per-query budget
+CANDIDATES = 20
+BUDGET_MS = 150.0
+
+# Most candidates scored per cross-encoder call; each call is sized to the
+# time left in the budget
+BATCH_SIZE = 8
+
+# Tokens per (query, passage) pair. The model costs roughly 40 MFLOP per
+# token, so a 512-token pair takes well over 100 ms on a CPU while a
+# 128-token one is ~30-50 ms; the query plus the opening of a chunk carries
+# most of the signal. Even so, only the first few candidates fit the
+# default BUDGET_MS; give --budget-ms ~1000 to cross-encode all CANDIDATES.
+MAX_LENGTH = 128
+
+# Assumed cost of one pair until a real call has been timed (warmup()
+# measures it up front); deliberately pessimistic
+INITIAL_PAIR_MS = 40.0
+
+# When no pair fits the remaining budget the estimate is shrunk by this
+# factor, so a stale or pessimistic estimate is re-measured eventually
+# instead of disabling the cross-encoder for good
+ESTIMATE_DECAY = 0.9
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# ---------------------------------------------------------
+#  Scorers
+# ---------------------------------------------------------
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def lexical_overlap_scores(query, texts):
+    """Fraction of distinct query terms found in each text (cheap, no model)."""
+    query_terms = set(_tokens(query))
+    if not query_terms:
+        return [0.0] * len(texts)
+    return [len(query_terms.intersection(_tokens(t))) / len(query_terms) for t in texts]
+
+
+_cross_encoder = None
+_cross_encoder_error = None  # set if loading failed; not retried
+_cross_encoder_loading = False
+_cross_encoder_lock = threading.Lock()
+
+# Running estimate (seconds) of scoring one pair, shared by every query so
+# even the first call of a query is sized to the budget
+_pair_cost_s = INITIAL_PAIR_MS / 1000
+
+
+def get_cross_encoder():
+    """
+    Load the cross-encoder on first use and cache it.
+
+    A failed load (e.g. no network for the download) is remembered and
+    re-raised on later calls instead of being retried.
+    """
+    global _cross_encoder, _cross_encoder_error
+    if _cross_encoder is None:
+        with _cross_encoder_lock:
+            if _cross_encoder_error is not None:
+                raise _cross_encoder_error
+            if _cross_encoder is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+
+                    start = time.perf_counter()
+                    _cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL, max_length=MAX_LENGTH)
+                except Exception as e:
+                    _cross_encoder_error = e
+                    print(f"⚠️ Cross-encoder unavailable ({e}) — reranking with {FALLBACK_SCORER} instead")
+                    raise
+                print(f"⏱️ Reranker loaded in {time.perf_counter() - start:.2f}s")
+    return _cross_encoder
+
+
+def _load_in_background():
+    """Start loading the cross-encoder off the query path (once)."""
+    global _cross_encoder_loading
+    with _cross_encoder_lock:
+        if _cross_encoder_loading:
+            return
+        _cross_encoder_loading = True
+
+    def load():
+        try:
+            get_cross_encoder()
+        except Exception:
+            pass  # reported once by get_cross_encoder; rerank() falls back
+
+    threading.Thread(target=load, name="rerank-load", daemon=True).start()
+
+
+def _record_pair_cost(seconds):
+    """Update the per-pair estimate (moving average)."""
+    global _pair_cost_s
+    _pair_cost_s = 0.7 * _pair_cost_s + 0.3 * seconds
+
+
+def _decay_pair_cost():
+    """Shrink the estimate when nothing fitted, so a later query re-measures it."""
+    global _pair_cost_s
+    _pair_cost_s *= ESTIMATE_DECAY
+
+
+def warmup():
+    """
+    Load the cross-encoder and seed the per-pair cost estimate.
+
+    The first predict() call pays one-off start-up costs, so a second, warm
+    batch is the one that gets timed.
+    """
+    global _pair_cost_s
+    try:
+        model = get_cross_encoder()
+    except Exception:
+        return  # reported by get_cross_encoder; queries fall back
+    batch = [("warmup", " ".join(["warmup"] * MAX_LENGTH))] * BATCH_SIZE  # full-length pairs
+    model.predict(batch, batch_size=BATCH_SIZE)
+    start = time.perf_counter()
+    model.predict(batch, batch_size=BATCH_SIZE)
+    _pair_cost_s = (time.perf_counter() - start) / BATCH_SIZE
+    print(f"⏱️ Reranker: {_pair_cost_s * 1000:.1f} ms per pair")
+
+
+# ---------------------------------------------------------
+#  Cascade
+# ---------------------------------------------------------
+
+class QueryBudget:
+    """
+    Scorer, candidate count and deadline for one query.
+
+    The budget covers encode + search + rerank: the clock starts when the
+    object is created (or at `start`), so create it after any one-off
+    loading and just before encoding the query.
+    """
+
+    def __init__(self, scorer=None, budget_ms=None, start=None):
+        self.scorer = scorer or DEFAULT_SCORER
+        self.budget_ms = BUDGET_MS if budget_ms is None else budget_ms
+        self.start = time.perf_counter() if start is None else start
+        self.deadline = self.start + self.budget_ms / 1000
+
+    def n_candidates(self, top_k):
+        """First-stage results to fetch so the reranker has something to reorder."""
+        return top_k if self.scorer == "none" else max(top_k, CANDIDATES)
+
+    def report(self, info):
+        """Print a one-line note when reranking ran out of budget."""
+        if info["degraded"]:
+            print(f"⚠️ Rerank budget ({self.budget_ms:.0f} ms) exceeded — reranked {info['scored']} "
+                  f"of {info['candidates']} candidates, rest in FAISS order")
+
+
+def rerank(query, candidates, top_k, scorer=None, deadline=None, text_key="text"):
+    """
+    Rerank first-stage candidates and return (results, info).
+
+    candidates: metadata records in first-stage (FAISS) order.
+    deadline:   time.perf_counter() value by which reranking must finish.
+                Each cross-encoder call scores only as many pairs as the
+                per-pair estimate says still fit; the scored prefix is
+                then reranked and the rest
+                keeps its first-stage order (graceful degradation). If the
+                cross-encoder isn't loaded yet it is loaded in the background
+                and the first-stage order is returned; if loading failed,
+                FALLBACK_SCORER is used instead.
+    info:       dict with the scorer used, how many candidates were scored,
+                whether it degraded and timing.
+    """
+    scorer = scorer or DEFAULT_SCORER
+    if scorer not in SCORERS:
+        raise ValueError(f"Unknown reranker: {scorer!r} (expected one of {SCORERS})")
+    if scorer == "cross" and _cross_encoder_error is not None:
+        scorer = FALLBACK_SCORER
+
+    start = time.perf_counter()
+    info = {"scorer": scorer, "candidates": len(candidates), "scored": 0,
+            "degraded": False, "rerank_ms": 0.0}
+    first_stage = candidates[:top_k]
+
+    if scorer == "none" or len(candidates) <= 1:
+        return first_stage, info
+
+    texts = [c.get(text_key, "") for c in candidates]
+
+    if scorer == "lexical":
+        scores = lexical_overlap_scores(query, texts)
+    elif _cross_encoder is None and deadline is not None:
+        # Loading the model would blow the budget; do it off the query path
+        _load_in_background()
+        scores = []
+    else:
+        try:
+            model = get_cross_encoder()
+        except Exception:
+            return rerank(query, candidates, top_k, FALLBACK_SCORER, deadline, text_key)
+        scores = []
+        while len(scores) < len(texts):
+            now = time.perf_counter()
+            n = BATCH_SIZE
+            if deadline is not None:
+                # Only as many pairs as are expected to fit the remaining budget
+                n = min(n, int((deadline - now) / _pair_cost_s))
+                if n < 1:
+                    _decay_pair_cost()
+                    break
+            batch = [(query, t) for t in texts[len(scores):len(scores) + n]]
+            scores.extend(float(s) for s in model.predict(batch, batch_size=BATCH_SIZE))
+            _record_pair_cost((time.perf_counter() - now) / len(batch))
+
+    info["scored"] = len(scores)
+    info["degraded"] = len(scores) < len(candidates)
+    info["rerank_ms"] = (time.perf_counter() - start) * 1000
+    metrics.observe(f"query.rerank_{scorer}", info["rerank_ms"] / 1000)
+    if info["degraded"]:
+        metrics.inc("query.rerank_degraded")
+
+    # Rerank the scored prefix (stable sort keeps first-stage order for ties);
+    # anything not scored follows in first-stage order
+    order = sorted(range(len(scores)), key=lambda i: -scores[i])
+    ranked = [candidates[i] for i in order] + candidates[len(scores):]
+    return ranked[:top_k], info
@@ -1,8 +1,20 @@
-import faiss
+import time
+_IMPORT_START = time.perf_counter()
+
+import argparse
 import json
-import numpy as np
-from sentence_transformers import SentenceTransformer
 import os # Import the os module to help build file paths
+import threading
+
+import metrics
+
+# NOTE: startup cost. faiss, numpy and the model libraries (torch /
+# onnxruntime / sentence_transformers) are imported only inside functions,
+# here and in the modules the query path uses (encoder, hierarchy, rerank,
+# context_builder), so starting retrieve.py, rag_free_test.py or
+# batch_server.py doesn't pay for them until the first load or the
+# background warm-up thread. Keep new top-level imports in those modules
+# to the standard library and other modules that follow this rule.
 
 # --- 1. Configuration ---
 
@@ -10,128 +22,333 @@ import os # Import the os module to help build file paths
 MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
 
 # Define the base directory for your indexes
-BASE_INDEX_DIR = "faiss_indexes" 
-
-# Ask the user which language to search
-lang = input("Which language to search? (en/ur): ").strip().lower()
-
-if lang == 'ur':
-    # --- UPDATED FILE PATHS ---
-    FAISS_INDEX_FILE = os.path.join(BASE_INDEX_DIR, "urdu_faiss.index")
-    METADATA_FILE = os.path.join(BASE_INDEX_DIR, "urdu_metadata.json")
-    print("Loading URDU database...")
-elif lang == 'en':
-    # --- UPDATED FILE PATHS ---
-    # Note: Your filename is 'englis_metadata.json', I've corrected it here.
-    # If 'englis_metadata.json' is the real name, change it below.
-    FAISS_INDEX_FILE = os.path.join(BASE_INDEX_DIR, "english_faiss.index")
-    METADATA_FILE = os.path.join(BASE_INDEX_DIR, "english_metadata.json") # Corrected from 'englis'
-    print("Loading ENGLISH database...")
-else:
-    print("Invalid language. Exiting.")
-    exit()
-
-# --- 2. Load Model and Data ---
-
-try:
-    # Load the FAISS index
-    index = faiss.read_index(FAISS_INDEX_FILE)
-
-    # Load the metadata
-    with open(METADATA_FILE, 'r', encoding='utf-8') as f:
-        metadata_list = json.load(f)
-        
-    # Convert metadata list to a dictionary for fast lookups
-    metadata_map = {item['id']: item for item in metadata_list}
-
-    # Load the Sentence Transformer model
-    print("Loading embedding model...")
-    model = SentenceTransformer(MODEL_NAME)
-    print("✅ Database and model loaded successfully!")
-
-except FileNotFoundError:
-    print(f"Error: Could not find '{FAISS_INDEX_FILE}' or '{METADATA_FILE}'.")
-    print(f"Please check your directory structure. Looking in: {os.path.abspath(BASE_INDEX_DIR)}")
-    exit()
-except Exception as e:
-    print(f"An error occurred during loading: {e}")
-    exit()
+BASE_INDEX_DIR = "faiss_indexes"
+
+# Index + metadata file per language
+INDEX_FILES = {
+    "en": ("english_faiss.index", "english_metadata.json"),
+    "ur": ("urdu_faiss.index", "urdu_metadata.json"),
+}
+
+LANGUAGE_NAMES = {"en": "ENGLISH", "ur": "URDU"}
+
+# Encoder backend: None uses EMBED_BACKEND ("torch", "onnx" or "onnx-int8")
+BACKEND = None
+
+# Documents searched at the chunk level (None = hierarchy.TOP_DOCS, 0 = flat)
+TOP_DOCS = None
+
+# Second stage: None uses RERANK_SCORER ("cross", "lexical" or "none"), and
+# the per-query millisecond budget covering encode + search + rerank
+RERANKER = None
+BUDGET_MS = None
+
+# --- 2. Lazy Loaders ---
+
+_model = None
+_model_lock = threading.Lock()
+
+_databases = {}  # lang -> (index, metadata_map)
+_hierarchies = {}  # lang -> DocumentHierarchy or None
+_database_lock = threading.Lock()
+
+
+def get_model():
+    """Load the embedding model (see encoder.load_encoder) on first use and cache it."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from encoder import load_encoder
+
+                print(f"Loading embedding model ({BACKEND or 'default'} backend)...")
+                start = time.perf_counter()
+                with metrics.timer("query.load_model"):
+                    _model = load_encoder(MODEL_NAME, BACKEND)
+                print(f"⏱️ Model loaded in {time.perf_counter() - start:.2f}s")
+    return _model
+
+
+def load_database(lang):
+    """
+    Load (and cache) the FAISS index and metadata map for a language.
+
+    Raises FileNotFoundError if the index or metadata file is missing.
+    """
+    if lang not in INDEX_FILES:
+        raise ValueError(f"Invalid language: {lang!r} (expected one of {list(INDEX_FILES)})")
+
+    if lang in _databases:
+        metrics.inc("query.db_cache_hits")
+    else:
+        with _database_lock:
+            if lang not in _databases:
+                import faiss
+
+                index_name, metadata_name = INDEX_FILES[lang]
+                index_file = os.path.join(BASE_INDEX_DIR, index_name)
+                metadata_file = os.path.join(BASE_INDEX_DIR, metadata_name)
+
+                print(f"Loading {LANGUAGE_NAMES[lang]} database...")
+                start = time.perf_counter()
+
+                # Load the FAISS index
+                with metrics.timer("query.read_index"):
+                    index = faiss.read_index(index_file)
+
+                # Load the metadata
+                with metrics.timer("query.load_metadata"), open(metadata_file, 'r', encoding='utf-8') as f:
+                    metadata_list = json.load(f)
+
+                # Convert metadata list to a dictionary for fast lookups
+                metadata_map = {item['id']: item for item in metadata_list}
+
+                # Document level of the two-level index (None if not built yet)
+                from hierarchy import load_hierarchy
+
+                prefix = index_name[:-len("_faiss.index")]
+                _hierarchies[lang] = load_hierarchy(BASE_INDEX_DIR, prefix, index)
+
+                _databases[lang] = (index, metadata_map)
+                print(f"⏱️ Database loaded in {time.perf_counter() - start:.2f}s")
+    return _databases[lang]
+
+
+def get_hierarchy(lang):
+    """Document → chunk hierarchy for a language, or None (flat search only)."""
+    load_database(lang)
+    return _hierarchies.get(lang)
+
+
+def warmup(lang):
+    """
+    Load the model and database, then run a dummy encode + search so the
+    first real query doesn't pay for lazy initialisation.
+    """
+    import numpy as np
+    import rerank
+
+    start = time.perf_counter()
+    model = get_model()
+    index, _ = load_database(lang)
+    dummy = np.array([model.encode("warmup")]).astype('float32')
+    index.search(dummy, 1)
+    if (RERANKER or rerank.DEFAULT_SCORER) == "cross":
+        rerank.warmup()
+    print(f"🔥 Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+
+def start_warmup(lang=None):
+    """
+    Start a background warm-up thread.
+
+    If `lang` is None only the model is loaded (it is shared by both
+    languages); otherwise the full warm-up for that language is run.
+    Returns the started thread; an exception it raises is kept on
+    `thread.error` rather than printed (see join_warmup).
+    """
+    target = get_model if lang is None else (lambda: warmup(lang))
+
+    def run():
+        try:
+            target()
+        except Exception as e:
+            thread.error = e
+
+    thread = threading.Thread(target=run, name="retrieve-warmup", daemon=True)
+    thread.error = None
+    thread.start()
+    return thread
+
+
+def join_warmup(thread):
+    """Wait for a start_warmup thread and re-raise anything it raised."""
+    thread.join()
+    if thread.error is not None:
+        raise thread.error
 
 # --- 3. The Search Function ---
 
-def search(query_text, k=3):
+def run_search(query_text, k=3, lang="en", reranker=None, budget_ms=None, top_docs=None):
     """
-    Performs a semantic search.
-    
+    Encode, search and rerank one query without printing anything; this is
+    the path search() serves and benchmark.py measures.
+
     1. Converts the query_text to an embedding.
-    2. Searches the FAISS index for the k-nearest neighbors.
-    3. Looks up the metadata for those neighbors and returns them.
+    2. Searches for a wider set of candidates: first the `top_docs` closest
+       documents, then only their chunks (flat FAISS search if the document
+       index hasn't been built or top_docs is 0).
+    3. Looks up the metadata for those neighbors.
+    4. Reranks the candidates (see rerank.py) within the per-query budget and
+       returns the top k; if the budget runs out, candidates not yet scored
+       keep their FAISS order.
+
+    Returns (results, info): rerank.rerank's info plus the first-stage
+    "ids", the ids "missing" from the metadata and the query's "budget".
     """
-    if not query_text:
-        return []
+    import numpy as np
+    import hierarchy
+    import rerank
+
+    top_docs = top_docs if top_docs is not None else (TOP_DOCS if TOP_DOCS is not None else hierarchy.TOP_DOCS)
+
+    model = get_model()
+    index, metadata_map = load_database(lang)
+    doc_hierarchy = get_hierarchy(lang) if top_docs else None
+
+    # The budget covers the query itself, not one-off lazy loading
+    budget = rerank.QueryBudget(reranker or RERANKER, budget_ms if budget_ms is not None else BUDGET_MS)
+    n_candidates = budget.n_candidates(k)
 
-    print(f"\nEmbedding query: '{query_text}'")
-    
     # 1. Convert the query text to an embedding (vector)
-    query_vector = model.encode(query_text)
-    
+    with metrics.timer("query.encode"):
+        query_vector = model.encode(query_text)
+
     # 2. FAISS requires a 2D numpy array, so we reshape and ensure float32
     query_vector_np = np.array([query_vector]).astype('float32')
 
     # 3. Search the FAISS index
     # D = distances (how far), I = indices (the 'id's from your metadata)
+    with metrics.timer("query.search"):
+        if doc_hierarchy is not None:
+            D, I = doc_hierarchy.search(query_vector_np, n_candidates, top_docs)
+        else:
+            D, I = index.search(query_vector_np, n_candidates)
+
+    # 4. Use the indices (I) to look up the metadata
+    # I is a 2D array (e.g., [[504, 1, 0]]), so we get the first list
+    ids = [i for i in I[0].tolist() if i != -1]
+    results = [metadata_map[i] for i in ids if i in metadata_map]
+
+    # 5. Second stage: rerank under the remaining budget
+    results, info = rerank.rerank(query_text, results, k, scorer=budget.scorer, deadline=budget.deadline)
+    metrics.inc("query.requests")
+    metrics.observe("query.total", time.perf_counter() - budget.start)
+
+    info["ids"] = ids
+    info["missing"] = [i for i in ids if i not in metadata_map]
+    info["budget"] = budget
+    return results, info
+
+
+def search(query_text, k=3, lang="en", reranker=None, budget_ms=None, top_docs=None):
+    """Performs a semantic search (see run_search) and reports what happened."""
+    if not query_text:
+        return []
+
+    print(f"\nEmbedding query: '{query_text}'")
     try:
-        D, I = index.search(query_vector_np, k)
+        results, info = run_search(query_text, k, lang, reranker, budget_ms, top_docs)
     except Exception as e:
         print(f"Error during FAISS search: {e}")
         return []
 
-    # 4. Use the indices (I) to look up the metadata
-    results = []
-    
-    # I is a 2D array (e.g., [[504, 1, 0]]), so we get the first list
-    indices = I[0] 
-    
-    print(f"Found {len(indices)} matching chunks (IDs: {indices})...")
-    
-    for idx in indices:
-        # Use our fast metadata_map to get the result
-        # .item() converts numpy int to native python int for JSON key
-        result = metadata_map.get(idx.item()) 
-        if result:
-            results.append(result)
-        else:
-            print(f"Warning: Could not find metadata for ID {idx.item()}")
-            
+    print(f"Found {len(info['ids'])} matching chunks (IDs: {info['ids']})...")
+    for idx in info["missing"]:
+        print(f"Warning: Could not find metadata for ID {idx}")
+
+    info["budget"].report(info)
+    if not info["degraded"] and info["scorer"] != "none":
+        print(f"Reranked {info['candidates']} candidates with {info['scorer']} "
+              f"in {info['rerank_ms']:.1f} ms")
+
     return results
 
 # --- 4. Main Program Loop ---
 
-if __name__ == "__main__":
-    # Place this script in your main FYP_TEXT directory
-    # It will look for the 'faiss_indexes' folder relative to itself.
-    print(f"FYP_TEXT retrieval script running from: {os.getcwd()}")
-    
-    print("\n--- PQNK Semantic Search ---")
-    print("Type your query and press Enter. Type 'q' to quit.")
-    
+def query_loop(lang, k=3):
+    """Interactive prompt: read queries until 'q' and print the top results."""
+    first_query = True
     while True:
         query = input("\nQuery: ")
-        
+
         if query.lower() == 'q':
             break
-            
+
         # 5. Perform the search
-        search_results = search(query, k=3)
-        
+        start = time.perf_counter()
+        search_results = search(query, k=k, lang=lang)
+        if first_query and query:
+            print(f"⏱️ First query answered in {time.perf_counter() - start:.3f}s")
+            first_query = False
+
         # 6. Print the results
         if not search_results:
             print("No results found.")
             continue
-            
+
         print("\n--- Top Results ---")
         for i, res in enumerate(search_results):
             print(f"\nResult {i+1}:")
             print(f"  Source: {res['filename']}")
             print(f"  Category: {res['category']}")
-            print(f"  Text: ...{res['text'][:500]}...") # Print first 500 chars
\ No newline at end of file
+            print(f"  Text: ...{res['text'][:500]}...") # Print first 500 chars
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PQNK semantic search")
+    parser.add_argument("--lang", choices=sorted(INDEX_FILES),
+                        help="Language to search (prompted for if omitted)")
+    parser.add_argument("--warmup", action="store_true",
+                        help="Run a dummy encode + search before the first prompt")
+    parser.add_argument("-k", type=int, default=3, help="Number of results per query")
+    parser.add_argument("--backend", choices=["torch", "onnx", "onnx-int8"],
+                        help="Query encoder backend (default: EMBED_BACKEND or torch)")
+    parser.add_argument("--rerank", choices=["cross", "lexical", "none"],
+                        help="Second-stage reranker (default: RERANK_SCORER or lexical)")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Per-query latency budget in milliseconds")
+    parser.add_argument("--top-docs", type=int, default=None,
+                        help="Documents to search at chunk level (0 = flat search)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    print(f"⏱️ Imports finished in {time.perf_counter() - _IMPORT_START:.3f}s")
+
+    args = parse_args()
+    BACKEND = args.backend
+    RERANKER = args.rerank
+    BUDGET_MS = args.budget_ms
+    TOP_DOCS = args.top_docs
+
+    # Place this script in your main FYP_TEXT directory
+    # It will look for the 'faiss_indexes' folder relative to itself.
+    print(f"FYP_TEXT retrieval script running from: {os.getcwd()}")
+
+    # The model is the slowest component and doesn't depend on the language,
+    # so start loading it while the user is still answering the prompt.
+    warmup_thread = start_warmup(args.lang if args.warmup else None)
+
+    lang = args.lang
+    if lang is None:
+        # Ask the user which language to search
+        lang = input("Which language to search? (en/ur): ").strip().lower()
+    if lang not in INDEX_FILES:
+        print("Invalid language. Exiting.")
+        exit()
+
+    try:
+        if args.warmup:
+            join_warmup(warmup_thread)
+            if args.lang is None:
+                warmup(lang)
+        else:
+            load_database(lang)
+    except FileNotFoundError:
+        index_name, metadata_name = INDEX_FILES[lang]
+        print(f"Error: Could not find '{index_name}' or '{metadata_name}'.")
+        print(f"Please check your directory structure. Looking in: {os.path.abspath(BASE_INDEX_DIR)}")
+        exit()
+    except Exception as e:
+        print(f"An error occurred during loading: {e}")
+        exit()
+
+    print("✅ Database loaded successfully!")
+    print(f"⏱️ Ready for queries after {time.perf_counter() - _IMPORT_START:.2f}s")
+
+    print("\n--- PQNK Semantic Search ---")
+    print("Type your query and press Enter. Type 'q' to quit.")
+
+    with metrics.profiled("retrieve"):
+        query_loop(lang, args.k)